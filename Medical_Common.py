@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set
+
+# ==========================================
+# [공용 설정 / 헬퍼]
+# ==========================================
+# 여러 스크립트(Seed Creator / Data Creator / SFT Exporter / Analyzer)가 같이 쓰는 경로, teacher 엔드포인트 설정,
+# intent 정의와 가벼운 헬퍼만 둠
+# (requests / tracer 같은 무거운 의존성 없음 -> 프로세스 풀 워커에서 import해도 부담 없음)
+BASE_DIR = "/home/HongKi-Arch/Desktop/LLM_DATASET_Project/Data"
+INPUT_FILE = os.path.join(BASE_DIR, "scenarios.json")   # JSON 배열 또는 JSONL
+OUTPUT_FILE = os.path.join(BASE_DIR, "medical_chat_data.jsonl")
+RUN_STATS_FILE = OUTPUT_FILE + ".runs.jsonl"   # 실행별 실패/수선 통계 (Data Creator가 쓰고 Analyzer가 읽음)
+
+# Teacher 엔드포인트 (Seed Creator / Data Creator 공용)
+PORTS = [22134]  # SSH 터널링 포트들 (여러 개면 로드밸런싱)
+MODEL = "gpt-oss:120b"
+KEEP_ALIVE = "60m"        # 모든 요청에 keep_alive 지정 -> 서버가 모델을 내리지 않게
+
+# num_ctx (Ollama에서는 runner 옵션이라 값이 바뀌면 모델을 통째로 다시 로드함)
+# -> 두 스크립트 모두 포트마다 base_num_ctx(port)로 시작 (같은 엔드포인트를 동시에 써도 요청마다 reload되지 않음)
+#    프롬프트가 안 들어가거나 출력이 잘릴 때만 다음 버킷으로 올리고 그 크기를 유지 (올린 크기는 스크립트끼리 공유하지 않음)
+# PORTS가 2개 이상이면 PORTS[0]은 NUM_CTX_SMALL로 시작 -> 짧은 프롬프트가 그 포트로 가서 KV 캐시를 덜 씀
+NUM_CTX_BASE = 8192
+NUM_CTX_SMALL = 4096
+NUM_CTX_BUCKETS = [4096, 8192, 16384]
+
+# HPI intent 목록
+HPI_INTENTS = {"onset", "location", "severity", "quality", "aggravating", "relieving", "associated"}
+
+# intent 문자열 매칭용 별칭 (teacher가 "aggravating_factors", "medication" 등으로 쓰는 경우)
+# - intent를 '_', '-', 공백으로 나눈 단어가 별칭으로 시작하면 매칭
+# - 한 턴은 항목 하나로만 셈 (위에 있는 항목 우선) -> "medication_history"는 meds만 (history로 이중 집계 안 함)
+INTENT_ALIASES = {
+    "meds": ("meds", "medication", "drug"),
+    "onset": ("onset", "duration"),
+    "location": ("location", "region", "radiat"),
+    "severity": ("severity",),
+    "quality": ("quality", "character"),
+    "aggravating": ("aggravat", "provo"),
+    "relieving": ("reliev", "allevia"),
+    "associated": ("associat",),
+    "history": ("history",),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토크나이저 없이 보수적으로 토큰 수 추정
+    - ASCII(영문/JSON 기호)는 약 4자당 1토큰, 한글 등 비ASCII는 1자당 1토큰으로 계산 (과대추정 쪽)
+    """
+    if not text:
+        return 0
+    n_ascii = len(text.encode("ascii", "ignore"))
+    return n_ascii // 4 + (len(text) - n_ascii) + 16
+
+
+def base_num_ctx(port: int) -> int:
+    """포트의 시작 num_ctx (Seed Creator / Data Creator가 같은 값을 써야 모델 reload가 없음)"""
+    return NUM_CTX_SMALL if len(PORTS) > 1 and port == PORTS[0] else NUM_CTX_BASE
+
+
+def pick_ctx_bucket(need_tokens: int) -> int:
+    """need_tokens가 들어가는 가장 작은 버킷 크기 (없으면 가장 큰 버킷)"""
+    for size in NUM_CTX_BUCKETS:
+        if need_tokens <= size:
+            return size
+    return NUM_CTX_BUCKETS[-1]
+
+
+def is_truncated(body: Dict[str, Any], num_ctx: int) -> bool:
+    """출력이 길이 제한에 걸렸거나, 프롬프트 + 출력이 컨텍스트를 꽉 채웠으면 잘린 것으로 판단"""
+    if body.get("done_reason") == "length":
+        return True
+    return body.get("prompt_eval_count", 0) + body.get("eval_count", 0) >= num_ctx
+
+
+def intent_key(intent: Any) -> Optional[str]:
+    """intent 라벨 -> INTENT_ALIASES 항목 하나 (단어 단위 매칭, 없으면 None)"""
+    return _intent_key(str(intent))
+
+
+@lru_cache(maxsize=4096)
+def _intent_key(intent: str) -> Optional[str]:
+    """라벨 어휘가 작아서 캐시가 거의 항상 맞음 (Analyzer / validate_dialogue에서 턴마다 호출)"""
+    words = [w for w in re.split(r"[_\-\s]+", intent.lower()) if w]
+    for key, aliases in INTENT_ALIASES.items():
+        if any(w.startswith(a) for w in words for a in aliases):
+            return key
+    return None
+
+
+def intent_coverage(dlg: List[Dict[str, Any]]) -> Set[str]:
+    """Assistant 턴의 intent들이 커버한 INTENT_ALIASES 항목 (턴 하나당 항목 하나)"""
+    covered: Set[str] = set()
+    for turn in dlg:
+        if not isinstance(turn, dict) or turn.get("role") != "assistant":
+            continue
+        key = intent_key(turn.get("intent", ""))
+        if key:
+            covered.add(key)
+    return covered
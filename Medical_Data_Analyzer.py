@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson  # 선택 의존성 (있으면 json 파싱이 훨씬 빠름)
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from Medical_Common import HPI_INTENTS, INPUT_FILE, OUTPUT_FILE, RUN_STATS_FILE, intent_coverage
+from Medical_Dataset_IO import fingerprint, iter_json_items, iter_records_since, new_cursor
+
+# ==========================================
+# [설정]
+# ==========================================
+CACHE_FILE = OUTPUT_FILE + ".analytics.json"   # 누적 집계 + 읽은 위치(cursor) sidecar
+LEN_BUCKET = 20                                # content 길이 히스토그램 버킷 폭 (글자 수)
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024          # 새 꼬리가 이보다 크면 byte range로 나눠 병렬 처리
+
+
+# ==========================================
+# [집계]
+# ==========================================
+def _new_len() -> Dict[str, Any]:
+    return {"count": 0, "sum": 0, "min": None, "max": 0, "hist": Counter()}
+
+
+class Aggregates:
+    """
+    한 번의 패스로 쌓는 상수 메모리 집계 (merge 가능 -> 병렬 / 증분 처리)
+    - category x risk, intent 히스토그램, 대화 턴 수, assistant/user content 길이
+    - HPI_INTENTS 커버리지, 과거력/복용약 질문 여부
+    """
+
+    def __init__(self) -> None:
+        self.records = 0
+        self.invalid = 0
+        self.cat_risk: Counter = Counter()
+        self.intents: Counter = Counter()
+        self.turns: Counter = Counter()
+        self.lengths = {"assistant": _new_len(), "user": _new_len()}
+        self.hpi_hist: Counter = Counter()
+        self.hpi_intents: Counter = Counter()
+        self.asked: Counter = Counter()
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        dlg = (rec.get("conversation") or {}).get("dialogue")
+        if not isinstance(dlg, list):
+            self.invalid += 1
+            return
+        self.records += 1
+        seed = rec.get("seed_info") or {}
+        self.cat_risk[f"{seed.get('category', '')}|{seed.get('risk', '')}"] += 1
+        self.turns[str(len(dlg))] += 1
+
+        for turn in dlg:
+            if not isinstance(turn, dict):
+                continue
+            role = turn.get("role")
+            content = turn.get("content")
+            if role in self.lengths and isinstance(content, str):
+                st = self.lengths[role]
+                n = len(content)
+                st["count"] += 1
+                st["sum"] += n
+                st["min"] = n if st["min"] is None else min(st["min"], n)
+                st["max"] = max(st["max"], n)
+                st["hist"][str(n // LEN_BUCKET)] += 1
+            if role == "assistant":
+                self.intents[str(turn.get("intent", "")).lower().strip()] += 1
+
+        covered = intent_coverage(dlg)
+        hpi = covered & HPI_INTENTS
+        self.hpi_hist[str(len(hpi))] += 1
+        for h in hpi:
+            self.hpi_intents[h] += 1
+        for k in ("history", "meds"):
+            if k in covered:
+                self.asked[k] += 1
+
+    def merge(self, other: "Aggregates") -> None:
+        self.records += other.records
+        self.invalid += other.invalid
+        for name in ("cat_risk", "intents", "turns", "hpi_hist", "hpi_intents", "asked"):
+            getattr(self, name).update(getattr(other, name))
+        for role, o in other.lengths.items():
+            st = self.lengths[role]
+            st["count"] += o["count"]
+            st["sum"] += o["sum"]
+            if o["min"] is not None:
+                st["min"] = o["min"] if st["min"] is None else min(st["min"], o["min"])
+            st["max"] = max(st["max"], o["max"])
+            st["hist"].update(o["hist"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: (dict(v) if isinstance(v, Counter) else v) for k, v in self.__dict__.items() if k != "lengths"}
+        d["lengths"] = {r: dict(st, hist=dict(st["hist"])) for r, st in self.lengths.items()}
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "Aggregates":
+        agg = cls()
+        for k, v in d.items():
+            if k == "lengths":
+                for r, st in v.items():
+                    agg.lengths[r] = dict(st, hist=Counter(st["hist"]))
+            elif isinstance(getattr(agg, k, None), Counter):
+                setattr(agg, k, Counter(v))
+            elif hasattr(agg, k):
+                setattr(agg, k, v)
+        return agg
+
+
+def hist_percentile(hist: Counter, q: float) -> int:
+    """버킷 히스토그램에서 근사 분위수 (버킷 상단값)"""
+    total = sum(hist.values())
+    if not total:
+        return 0
+    acc = 0
+    for b in sorted(hist, key=int):
+        acc += hist[b]
+        if acc >= q * total:
+            return (int(b) + 1) * LEN_BUCKET
+    return 0
+
+
+# ==========================================
+# [스캔 (워커 프로세스)]
+# ==========================================
+def scan_plain_range(args: Tuple[str, int, int]) -> Tuple[Dict[str, Any], int]:
+    """[start, end) 구간(줄 시작 정렬) 집계 -> (집계, 마지막으로 완결된 줄의 끝 offset)"""
+    path, start, end = args
+    agg = Aggregates()
+    pos = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        for line in f:
+            if pos >= end or not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                agg.add(_loads(line))
+            except Exception:
+                agg.invalid += 1
+    return agg.to_dict(), pos
+
+
+def split_ranges(path: str, start: int, end: int, n: int) -> List[Tuple[str, int, int]]:
+    """[start, end)를 n개로 나누되 경계를 줄 시작으로 맞춤"""
+    bounds = [start]
+    with open(path, "rb") as f:
+        for k in range(1, n):
+            f.seek(start + (end - start) * k // n)
+            f.readline()
+            b = min(f.tell(), end)
+            if b > bounds[-1]:
+                bounds.append(b)
+    bounds.append(end)
+    return [(path, a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+# ==========================================
+# [캐시]
+# ==========================================
+def empty_cache() -> Dict[str, Any]:
+    return {"cursor": new_cursor(), "fingerprint": "", "agg": Aggregates().to_dict(), "seeds": None}
+
+
+def load_cache() -> Dict[str, Any]:
+    empty = empty_cache()
+    if not os.path.exists(CACHE_FILE):
+        return empty
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except Exception:
+        return empty
+    # 파일이 덮어써졌으면(offset 위치의 내용이 달라짐) 처음부터 다시
+    if fingerprint(OUTPUT_FILE, cache["cursor"]) != cache.get("fingerprint", ""):
+        print("Dataset file changed since last analysis. Recomputing from scratch.")
+        empty["seeds"] = cache.get("seeds")
+        return empty
+    return cache
+
+
+def save_cache(cache: Dict[str, Any]) -> None:
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_FILE)
+
+
+# ==========================================
+# [분석]
+# ==========================================
+def update_dataset(cache: Dict[str, Any]) -> Tuple[Aggregates, int]:
+    """cursor 이후 꼬리만 집계해서 캐시된 집계에 merge"""
+    agg = Aggregates.from_dict(cache["agg"])
+    cursor = dict(cache["cursor"])
+    new_records = 0
+
+    # 1. 평문 JSONL 꼬리 (크면 byte range 병렬)
+    if os.path.exists(OUTPUT_FILE):
+        size = os.path.getsize(OUTPUT_FILE)
+        start = cursor["plain"]
+        if size > start:
+            ranges = [(OUTPUT_FILE, start, size)]
+            if WORKERS > 1 and size - start >= PARALLEL_MIN_BYTES:
+                ranges = split_ranges(OUTPUT_FILE, start, size, WORKERS * 4)
+                with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+                    results = list(ex.map(scan_plain_range, ranges))
+            else:
+                results = [scan_plain_range(r) for r in ranges]
+            for (d, end), (_, a, b) in zip(results, ranges):
+                part = Aggregates.from_dict(d)
+                agg.merge(part)
+                new_records += part.records
+                cursor["plain"] = end
+                if end < b:
+                    break  # 잘린 꼬리 줄 -> 다음 실행에서 처리
+
+    # 2. 압축 샤드 (cursor 이후 프레임만)
+    # (평문 부분은 위에서 처리했으므로 plain offset을 파일 끝으로 넘겨서 샤드만 읽음)
+    plain_size = os.path.getsize(OUTPUT_FILE) if os.path.exists(OUTPUT_FILE) else 0
+    for rec, cur in iter_records_since(OUTPUT_FILE, dict(cursor, plain=plain_size)):
+        agg.add(rec)
+        new_records += 1
+        cursor.update(shard=cur["shard"], frame=cur["frame"], line=cur["line"])
+
+    cache["agg"] = agg.to_dict()
+    cache["cursor"] = cursor
+    cache["fingerprint"] = fingerprint(OUTPUT_FILE, cursor)
+    return agg, new_records
+
+
+def update_seeds(cache: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """시드 풀은 Seed Creator가 통째로 다시 쓰므로 (size, mtime)가 바뀌었을 때만 재집계"""
+    if not os.path.exists(INPUT_FILE):
+        return None
+    st = os.stat(INPUT_FILE)
+    key = [st.st_size, int(st.st_mtime)]
+    seeds = cache.get("seeds")
+    if seeds and seeds.get("key") == key:
+        return seeds
+    cat_risk: Counter = Counter()
+    total = 0
+    for s in iter_json_items(INPUT_FILE):
+        if isinstance(s, dict):
+            total += 1
+            cat_risk[f"{s.get('category', '')}|{s.get('risk', '')}"] += 1
+    seeds = {"key": key, "total": total, "cat_risk": dict(cat_risk)}
+    cache["seeds"] = seeds
+    return seeds
+
+
+def load_run_stats() -> Dict[str, Counter]:
+    """RUN_STATS_FILE: run_id별 마지막 스냅샷을 합산"""
+    latest: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(RUN_STATS_FILE):
+        with open(RUN_STATS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                    latest[row["run_id"]] = row
+                except Exception:
+                    pass
+    totals = {"runs": Counter(), "stats": Counter(), "repair_stats": Counter(), "llm_stats": Counter()}
+    for row in latest.values():
+        totals["runs"]["finished" if row.get("finished") else "unfinished"] += 1
+        for k in ("stats", "repair_stats", "llm_stats"):
+            totals[k].update(row.get(k) or {})
+    return totals
+
+
+# ==========================================
+# [리포트]
+# ==========================================
+def print_report(agg: Aggregates, seeds: Optional[Dict[str, Any]], runs: Dict[str, Counter]) -> None:
+    n = agg.records or 1
+    print(f"\n=== Dataset: {agg.records} records (invalid {agg.invalid}) ===")
+
+    print("\n[Category x Risk]  dataset / seed pool")
+    seed_cr = (seeds or {}).get("cat_risk", {})
+    for key in sorted(set(agg.cat_risk) | set(seed_cr), key=lambda k: -agg.cat_risk.get(k, 0)):
+        cat, _, risk = key.partition("|")
+        print(f"  {cat:<12} {risk:<7} {agg.cat_risk.get(key, 0):>8} / {seed_cr.get(key, 0):>8}")
+    if seeds:
+        print(f"  (seed pool total {seeds['total']})")
+
+    print("\n[Intents]")
+    for intent, c in agg.intents.most_common(30):
+        print(f"  {intent or '(empty)':<24} {c:>8}")
+
+    print("\n[Turns per dialogue]")
+    for t in sorted(agg.turns, key=int):
+        print(f"  {t:>3} turns {agg.turns[t]:>8} ({agg.turns[t] / n:.1%})")
+
+    print("\n[Content length (chars)]")
+    for role, st in agg.lengths.items():
+        if not st["count"]:
+            continue
+        mean = st["sum"] / st["count"]
+        p50 = hist_percentile(st["hist"], 0.5)
+        p95 = hist_percentile(st["hist"], 0.95)
+        print(f"  {role:<9} n={st['count']} mean={mean:.1f} min={st['min']} max={st['max']} ~p50={p50} ~p95={p95}")
+
+    print(f"\n[HPI coverage] ({len(HPI_INTENTS)} intents)")
+    for h in sorted(HPI_INTENTS):
+        print(f"  {h:<12} {agg.hpi_intents.get(h, 0) / n:.1%}")
+    for k in sorted(agg.hpi_hist, key=int):
+        print(f"  covered {k}/{len(HPI_INTENTS)}: {agg.hpi_hist[k]:>8}")
+    print(f"  history asked: {agg.asked.get('history', 0) / n:.1%}, meds asked: {agg.asked.get('meds', 0) / n:.1%}")
+
+    print("\n[Generation runs]")
+    stats = runs["stats"]
+    print(f"  runs={dict(runs['runs'])}")
+    attempted = stats.get("success", 0) + sum(v for k, v in stats.items() if k.startswith(("dialogue_", "profile_")))
+    if attempted:
+        print(f"  attempted={attempted} success={stats.get('success', 0)} ({stats.get('success', 0) / attempted:.1%})")
+    for k, v in sorted(stats.items(), key=lambda kv: -kv[1]):
+        if k.startswith(("dialogue_", "profile_")):
+            print(f"  fail {k:<36} {v:>8}")
+    for k, v in sorted(runs["repair_stats"].items()):
+        print(f"  repair {k:<34} {v:>8}")
+    if runs["llm_stats"]:
+        print(f"  llm {dict(runs['llm_stats'])}")
+
+
+# ==========================================
+# [메인 로직]
+# ==========================================
+def main(use_cache: bool = True) -> Dict[str, Any]:
+    cache = load_cache() if use_cache else empty_cache()
+
+    agg, new_records = update_dataset(cache)
+    seeds = update_seeds(cache)
+    runs = load_run_stats()
+    save_cache(cache)
+
+    print(f"Analyzed {new_records} new records (cursor={cache['cursor']})")
+    print_report(agg, seeds, runs)
+    return cache
+
+
+if __name__ == "__main__":
+    main(use_cache=True)
@@ -9,23 +9,47 @@ import random
 import itertools
 import requests
 from collections import Counter
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from Medical_Common import (
+    HPI_INTENTS, INPUT_FILE, KEEP_ALIVE, MODEL, NUM_CTX_BUCKETS, OUTPUT_FILE, PORTS, RUN_STATS_FILE,
+    base_num_ctx, estimate_tokens, intent_coverage, is_truncated, pick_ctx_bucket,
+)
+from Medical_JSON_Extractor import extract_json
+from Medical_Tracer import Tracer
+from Medical_Scheduler import StyleScheduler
+from Medical_Dataset_IO import DatasetWriter, iter_json_items, iter_records, remove_dataset, shuffle_buffer
 
 # ==========================================
 # [설정]
 # ==========================================
-PORTS = [22134]
-MODEL = "gpt-oss:120b"
-
-BASE_DIR = "/home/HongKi-Arch/Desktop/LLM_DATASET_Project/Data"
-INPUT_FILE = os.path.join(BASE_DIR, "scenarios.json")
-OUTPUT_FILE = os.path.join(BASE_DIR, "medical_chat_data.jsonl")
+# 경로(BASE_DIR / INPUT_FILE / OUTPUT_FILE / RUN_STATS_FILE), 엔드포인트(PORTS / MODEL / KEEP_ALIVE)와
+# num_ctx 정책(NUM_CTX_BASE / NUM_CTX_SMALL / NUM_CTX_BUCKETS)은 Medical_Common.py에서 설정 (Seed Creator와 공용)
+SCHED_STATE_FILE = OUTPUT_FILE + ".sched.json" # 스케줄러 수락률/토큰 추정치 (실행 간 유지)
 
 # 생성 옵션
 MAX_CASES: Optional[int] = None 
 RANDOM_SEED: Optional[int] = 42
+SEED_SHUFFLE_BUFFER: Optional[int] = 10000   # 셔플 버퍼 크기 (None이면 전체 셔플, 메모리 상한 없음)
 OVERWRITE_OUTPUT = False
+
+# 수락률 기반 스케줄링 (Thompson sampling, False면 기존처럼 스타일 랜덤 + 셔플 순서 그대로)
+SCHEDULER = True
+SCHED_WINDOW = 64          # 셔플된 시드 스트림에서 이 개수만큼 보고 가장 유망한 시드를 먼저 처리
+STYLE_MIN_SHARE = 0.5      # 스타일 쌍 다양성 하한 (각 쌍이 수락 레코드의 min_share / 쌍 개수 이상)
+
+# 저장 옵션 (group commit: N건 또는 N초마다 한 번에 flush + fsync)
 AUTOSAVE_EVERY = 10
+AUTOSAVE_INTERVAL = 5.0
+OUTPUT_COMPRESSION: Optional[str] = None   # None(평문 JSONL) | "gzip" | "zstd" (회전 샤드 + byte offset idx)
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+
+# 타임라인 트레이스 (Chrome/Perfetto trace-event JSON, None이면 끔)
+TRACE_FILE: Optional[str] = None
+
+# 파싱 실패한 teacher 응답 덤프 (bench/teacher_outputs.jsonl 회귀 코퍼스 포맷, None이면 끔)
+PARSE_FAIL_DUMP: Optional[str] = None
 
 # LLM 파라미터
 PROFILE_TEMP = 0.70       # 약간 낮춤 (안정성)
@@ -33,8 +57,32 @@ DIALOGUE_TEMP = 0.55      # 약간 낮춤 (포맷 준수)
 REPAIR_TEMP = 0.30        # 수선은 확실하게
 TIMEOUT = 600
 RETRIES = 3
+# warm 포트의 요청 timeout = 토큰당 생성 시간 EWMA x 출력 예산 x 배수 (TIMEOUT_FLOOR ~ TIMEOUT 범위)
+# cold load는 EWMA에서 빠지므로 멈춘 요청을 TIMEOUT까지 기다리지 않고 빨리 포기함
+TIMEOUT_EWMA_MULT = 4.0
+TIMEOUT_FLOOR = 120
+
+# 모델 로드 관리 (120B는 첫 로드에 수 분 걸림)
+WARMUP = True             # 시작 시 모든 포트에 병렬로 모델 preload
+WARMUP_TIMEOUT = 1800
+COLD_LOAD_SEC = 5.0       # load_duration이 이 이상이면 cold load로 간주
+
+# 출력 예산 (num_ctx 버킷 선택에 사용)
+PROFILE_OUT_TOKENS = 1536     # gpt-oss reasoning 토큰 포함
+DIALOGUE_OUT_TOKENS = 3072
+REPAIR_OUT_TOKENS = 1536
 
 cycle = itertools.cycle(PORTS)
+active_ports = list(PORTS)   # 로테이션에 남은 포트 (warmup 실패 포트 제외)
+
+# 포트별 상태 (cold load는 latency 통계에서 제외)
+port_state: Dict[int, Dict[str, Any]] = {
+    p: {"warm": False, "tok_latency_ewma": None, "cold_loads": 0, "last_load_s": 0.0,
+        "num_ctx": base_num_ctx(p)} for p in PORTS
+}
+llm_stats: Counter = Counter()
+repair_stats: Counter = Counter()
+tracer = Tracer()
 
 # ==========================================
 # [다양성(Persona) 설정]
@@ -54,8 +102,10 @@ DOCTOR_STYLES = [
     "Efficient: 핵심만 빠르게 질문하여 감별 진단."
 ]
 
-# HPI intent 목록
-HPI_INTENTS = {"onset", "location", "severity", "quality", "aggravating", "relieving", "associated"}
+# 필수 문진 항목 (검증 / 이어쓰기 기준, DIALOGUE_PROMPT_TPL 규칙 4에도 그대로 들어감)
+# 기본값: 프롬프트 규칙 4의 HPI(onset/location/severity/quality) + 규칙 7의 과거력/복용약
+# HPI 전체를 강제하려면 HPI_INTENTS | {"history", "meds"} (대부분의 케이스가 이어쓰기 호출을 추가로 씀)
+REQUIRED_INTENTS = {"onset", "location", "severity", "quality", "history", "meds"}
 
 # ==========================================
 # [완벽을 위한 프롬프트 튜닝]
@@ -113,10 +163,10 @@ DIALOGUE_PROMPT_TPL = """
 3. User는 Assistant가 '포괄적인 질문(Open-ended question)'을 했을 때, 비로소 프로필의 정보를 구체적으로 답변한다.
 
 [대화 생성 규칙]
-1. Assistant는 매 턴 `thought`, `intent`, `content` 필수.
+1. Assistant는 매 턴 `thought`, `intent`, `content` 필수. intent는 다음 이름 중 하나를 그대로 사용: {intent_labels}
 2. Assistant는 한 턴에 질문 1개만. (물음표 '?'는 1개만 사용)
 3. Assistant와 User는 반드시 번갈아가며 등장.
-4. HPI(onset, location, severity, quality 등)를 충분히 수집 후, 마지막에 intent="summary"로 종료.
+4. HPI를 충분히 수집 후, 마지막에 intent="summary"로 종료. 최소한 다음 항목({required_intents})은 반드시 각각 질문해야 한다.
 5. Summary에서는 **대화 중에 User가 직접 말한 내용**만 요약해야 한다. (묻지 않은 정보 포함 금지)
 6. 출력은 JSON 포맷만.
 7. HPI 수집 후 Summary로 넘어가기 전에, 반드시 '과거력(History)'과 '약물(Meds)'을 확인하는 질문을 해야 한다.
@@ -170,6 +220,36 @@ REPAIR_DIALOGUE_PROMPT_TPL = """
 {{ "dialogue": [ ... ] }}
 """.strip()
 
+# 누락된 문진 항목만 이어서 묻기 (전체 재생성 대신)
+CONTINUE_DIALOGUE_PROMPT = """
+아래는 의사(Assistant)와 환자(User)의 문진 대화 중간까지다.
+아직 확인하지 않은 항목만 추가로 질문하는 턴들을 이어서 작성하라.
+
+[환자 프로필]
+{profile_json}
+
+[설정]
+- 의사 스타일: {doctor_style}
+- 환자 스타일: {user_style}
+
+[현재 대화]
+{dialogue_json}
+
+[추가로 확인할 항목 (intent)]
+{missing_intents}
+
+[규칙]
+1. 새로 추가할 턴만 출력한다. (기존 대화 반복 금지)
+2. Assistant로 시작해서 User로 끝나며, Assistant와 User는 번갈아 등장한다.
+3. Assistant는 매 턴 `thought`, `intent`, `content` 필수. intent는 위 항목 이름 중 하나를 그대로 쓴다.
+4. Assistant 질문은 한 턴에 1개만. 프로필의 병명/약물명을 먼저 언급하지 않는다.
+5. summary 턴은 쓰지 않는다.
+6. 출력은 JSON만.
+
+[출력 포맷(JSON)]
+{{ "dialogue": [ ... ] }}
+""".strip()
+
 # ... (나머지 APPEND_SUMMARY_PROMPT, ALLOWED_INTENTS 등은 그대로 유지) ...
 APPEND_SUMMARY_PROMPT = """
 아래 대화의 마지막에 의사(Assistant)의 '요약 및 권고(summary)' 턴을 추가하여 JSON을 완성하라.
@@ -195,65 +275,184 @@ APPEND_SUMMARY_PROMPT = """
 # ==========================================
 # [유틸리티]
 # ==========================================
-def call_llm(prompt: str, temperature: float) -> str:
-    for attempt in range(1, RETRIES + 1):
-        port = next(cycle)
+def record_timing(port: int, body: Dict[str, Any], warmup: bool = False) -> None:
+    """
+    Ollama 응답의 타이밍 필드(ns)로 cold load 판별
+    - load_duration >= COLD_LOAD_SEC 이면 cold load: 카운트만 하고 latency EWMA에는 반영 안 함
+      (warmup=True면 의도한 preload -> warmup_load로 따로 셈, cold_load는 예상 못 한 unload만)
+    - 그 외에는 출력 토큰당 순수 생성 시간((total - load) / eval_count)으로 EWMA 갱신 (request_timeout에서 사용)
+    """
+    st = port_state.setdefault(port, {"warm": False, "tok_latency_ewma": None, "cold_loads": 0, "last_load_s": 0.0, "num_ctx": base_num_ctx(port)})
+    load_s = body.get("load_duration", 0) / 1e9
+    total_s = body.get("total_duration", 0) / 1e9
+    st["warm"] = True
+    if load_s >= COLD_LOAD_SEC:
+        st["last_load_s"] = load_s
+        if warmup:
+            llm_stats["warmup_load"] += 1
+            return
+        st["cold_loads"] += 1
+        llm_stats["cold_load"] += 1
+        print(f"[LLM] Port {port}: cold load detected (load {load_s:.1f}s)")
+        return
+    n_out = body.get("eval_count", 0)
+    if n_out <= 0:
+        return
+    per_tok = max(0.0, total_s - load_s) / n_out
+    prev = st["tok_latency_ewma"]
+    st["tok_latency_ewma"] = per_tok if prev is None else 0.8 * prev + 0.2 * per_tok
+
+
+def request_timeout(port: int, out_tokens: int) -> float:
+    """warm 포트는 최근 생성 속도 기준 timeout, 상태를 모르는 포트(cold / 첫 요청)는 TIMEOUT 그대로"""
+    st = port_state.get(port, {})
+    ewma = st.get("tok_latency_ewma")
+    if not st.get("warm") or ewma is None:
+        return TIMEOUT
+    return min(TIMEOUT, max(TIMEOUT_FLOOR, TIMEOUT_EWMA_MULT * ewma * out_tokens))
+
+
+def warmup_port(port: int, preload: bool = True) -> Tuple[bool, str]:
+    """
+    빈 프롬프트로 모델 preload (Ollama는 prompt가 비어 있으면 로드만 하고 응답)
+    - call_llm과 같은 runner 옵션(num_ctx)으로 로드 -> 첫 실제 요청에서 다시 로드되지 않음
+    - preload=False: timeout 뒤 재로드 대기용 -> 로드가 일어났으면 예상 못 한 unload이므로 cold_load로 셈
+    """
+    url = f"http://127.0.0.1:{port}/api/generate"
+    payload = {
+        "model": MODEL,
+        "prompt": "",
+        "stream": False,
+        "keep_alive": KEEP_ALIVE,
+        "options": {"num_ctx": port_state.setdefault(port, {}).get("num_ctx", base_num_ctx(port))},
+    }
+    t0 = time.time()
+    try:
+        with tracer.span("warmup", cat="llm", track=port, port=port) as sp:
+            r = requests.post(url, json=payload, timeout=WARMUP_TIMEOUT)
+            r.raise_for_status()
+            body = r.json()
+            sp["load_s"] = body.get("load_duration", 0) / 1e9
+    except Exception as e:
+        port_state.setdefault(port, {})["warm"] = False
+        return False, str(e)
+    record_timing(port, body, warmup=preload)
+    return True, f"load {body.get('load_duration', 0) / 1e9:.1f}s, wall {time.time() - t0:.1f}s"
+
+
+def warmup_endpoints() -> List[int]:
+    """모든 포트 병렬 preload 후 포트별 준비 상태 출력, 준비된 포트만 로테이션에 남김"""
+    global cycle, active_ports
+    print(f"[Warmup] Preloading {MODEL} on ports {PORTS} (keep_alive={KEEP_ALIVE}) ...")
+    with ThreadPoolExecutor(max_workers=len(PORTS)) as ex:
+        results = list(ex.map(warmup_port, PORTS))
+
+    ready = []
+    for port, (ok, msg) in zip(PORTS, results):
+        print(f"[Warmup] Port {port}: {'READY' if ok else 'FAILED'} ({msg})")
+        if ok:
+            ready.append(port)
+    if ready:
+        cycle = itertools.cycle(ready)
+        active_ports = ready
+    return ready
+
+
+def pick_port(need_tokens: int) -> int:
+    """
+    현재 num_ctx에 need_tokens가 들어가는 포트 중 num_ctx가 가장 작은 포트를 고름 (같으면 로테이션 순서)
+    - 짧은 프롬프트는 작은 컨텍스트 포트(NUM_CTX_SMALL)로, 긴 대화 프롬프트는 큰 포트로 감
+    - 들어가는 포트가 없으면 다음 포트의 num_ctx를 필요한 버킷으로 올림 (reload 1회, 이후 그 크기 유지)
+    - 포트의 num_ctx는 줄이지 않음 -> 요청마다 컨텍스트가 바뀌어 모델이 다시 로드되는 일이 없음
+    """
+    first = next(cycle)
+    i = active_ports.index(first)
+    fits = [p for p in active_ports[i:] + active_ports[:i]
+            if port_state[p]["num_ctx"] >= need_tokens or port_state[p]["num_ctx"] >= NUM_CTX_BUCKETS[-1]]
+    if fits:
+        return min(fits, key=lambda p: port_state[p]["num_ctx"])
+    new_ctx = pick_ctx_bucket(need_tokens)
+    print(f"[LLM] Port {first}: num_ctx {port_state[first]['num_ctx']} -> {new_ctx} (model reload)")
+    port_state[first]["num_ctx"] = new_ctx
+    port_state[first]["warm"] = False   # 다음 요청은 reload를 포함하므로 EWMA 기반 timeout을 쓰지 않음
+    llm_stats["ctx_grow"] += 1
+    return first
+
+
+def call_llm(prompt: str, temperature: float, out_tokens: int = DIALOGUE_OUT_TOKENS, usage: Optional[Counter] = None) -> str:
+    attempt = 0
+    rewarmed = False
+    need = estimate_tokens(prompt) + out_tokens
+    while attempt < RETRIES:
+        attempt += 1
+        port = pick_port(need)
         url = f"http://127.0.0.1:{port}/api/generate"
+        num_ctx = port_state[port]["num_ctx"]
         payload = {
             "model": MODEL,
             "prompt": prompt,
             "stream": False,
-            "options": {"temperature": temperature, "top_p": 0.9, "num_ctx": 4096},
+            "keep_alive": KEEP_ALIVE,
+            "options": {"temperature": temperature, "top_p": 0.9, "num_ctx": num_ctx},
         }
+        llm_stats[f"ctx_{num_ctx}"] += 1
+        timeout = request_timeout(port, out_tokens)
         try:
-            r = requests.post(url, json=payload, timeout=TIMEOUT)
-            r.raise_for_status()
-            res = r.json().get("response", "")
+            with tracer.span("http", cat="llm", track=port, port=port, attempt=attempt, num_ctx=num_ctx, timeout=timeout) as sp:
+                r = requests.post(url, json=payload, timeout=timeout)
+                r.raise_for_status()
+                body = r.json()
+                sp.update(
+                    load_s=body.get("load_duration", 0) / 1e9,
+                    prompt_tokens=body.get("prompt_eval_count", 0),
+                    eval_tokens=body.get("eval_count", 0),
+                    done_reason=body.get("done_reason", ""),
+                )
+            record_timing(port, body)
+            if usage is not None:
+                usage["prompt"] += body.get("prompt_eval_count", 0)
+                usage["eval"] += body.get("eval_count", 0)
+            res = body.get("response", "")
+            # 잘린 출력 -> 한 단계 큰 버킷이 있는 포트로 재요청 (재시도 횟수는 소모하지 않음)
+            if is_truncated(body, num_ctx):
+                llm_stats["ctx_truncated"] += 1
+                if num_ctx < NUM_CTX_BUCKETS[-1]:
+                    need = max(need, num_ctx + 1)
+                    print(f"[LLM] Port {port}: output truncated at num_ctx={num_ctx}, retry with a larger context")
+                    attempt -= 1
+                    continue
             if res: return res
         except Exception as e:
+            st = port_state.setdefault(port, {})
+            # timeout = 모델이 내려가서 다시 로드 중일 가능성 (warm 포트는 EWMA 기반의 짧은 timeout)
+            # -> 재시도 대신 warmup으로 로드 완료까지 대기 (한 호출에 한 번만)
+            if isinstance(e, requests.Timeout) and not rewarmed:
+                st["warm"] = False
+                print(f"[LLM Timeout] Port {port}: timed out after {timeout:.0f}s, waiting for warmup ...")
+                rewarmed = True
+                ok, msg = warmup_port(port, preload=False)
+                print(f"[Warmup] Port {port}: {'READY' if ok else 'FAILED'} ({msg})")
+                if ok:
+                    attempt -= 1
+                continue
+            st["warm"] = False
             sleep_s = 1.0 * attempt # 대기 시간 조금 늘림
             print(f"[LLM Error] Port {port}: {e} (Sleep {sleep_s}s)")
-            time.sleep(sleep_s)
+            with tracer.span("backoff", cat="llm", port=port, sleep_s=sleep_s):
+                time.sleep(sleep_s)
+    llm_stats["no_response"] += 1
     return ""
 
-def extract_json(text: str) -> Dict[str, Any]:
-    if not text: return {}
-    # 1. ```json ... ``` 패턴
-    m = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
-    if m:
-        try: return json.loads(m.group(1))
-        except: pass
-    
-    # 2. 리스트만 덜렁 있는 경우 ([...]) -> 감싸주기
-    m_list = re.search(r"```(?:json)?\s*(\[.*?\])\s*```", text, flags=re.DOTALL)
-    if m_list:
-        try: return {"dialogue": json.loads(m_list.group(1))}
-        except: pass
-
-    # 3. Brace Scanning
-    start = text.find("{")
-    if start != -1:
-        # 간단한 스택 방식 (네스팅 고려)
-        count = 0
-        for i, char in enumerate(text[start:], start):
-            if char == '{': count += 1
-            elif char == '}': count -= 1
-            if count == 0:
-                try: return json.loads(text[start:i+1])
-                except: break
-    
-    # 4. 리스트 스캐닝 ([...])
-    start = text.find("[")
-    if start != -1:
-        count = 0
-        for i, char in enumerate(text[start:], start):
-            if char == '[': count += 1
-            elif char == ']': count -= 1
-            if count == 0:
-                try: return {"dialogue": json.loads(text[start:i+1])}
-                except: break
-                
-    return {}
+def dump_parse_failure(stage: str, text: str) -> None:
+    """추출 실패 응답을 코퍼스 포맷으로 append (검토 후 expect를 채워 회귀 코퍼스에 추가)"""
+    if not PARSE_FAIL_DUMP or not text:
+        return
+    row = {"id": f"{stage}_{int(time.time() * 1000)}", "stage": stage, "expect": "none", "text": text}
+    try:
+        with open(PARSE_FAIL_DUMP, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
 
 def normalize_key(text: str) -> str:
     if not text: return ""
@@ -315,34 +514,123 @@ def validate_dialogue(data: Dict[str, Any]) -> Tuple[bool, str]:
     if "summary" not in str(last_turn.get("intent", "")).lower():
         return False, "no_summary"
 
+    # HPI / 과거력 / 복용약 커버리지 (구조는 정상인데 문진 항목이 빠진 경우)
+    if REQUIRED_INTENTS - intent_coverage(dlg):
+        return False, "missing_intents"
+
     return True, "ok"
 
-def append_summary(profile_str: str, dlg_data: Dict) -> Dict:
+def append_summary(profile_str: str, dlg_data: Dict, usage: Optional[Counter] = None) -> Dict:
     """대화가 User로 끝났거나 Summary가 없을 때 강제로 Summary 턴 생성 후 부착"""
     dlg_json = json.dumps(dlg_data["dialogue"], ensure_ascii=False)
     prompt = APPEND_SUMMARY_PROMPT.format(profile_json=profile_str, dialogue_json=dlg_json)
     
     # LLM이 단일 턴 JSON을 줄 것을 기대?
-    res_str = call_llm(prompt, temperature=REPAIR_TEMP)
+    res_str = call_llm(prompt, temperature=REPAIR_TEMP, out_tokens=REPAIR_OUT_TOKENS, usage=usage)
     
-    # 파싱 시도 (객체 하나)
-    try:
-        # 간단히 중괄호 찾기
-        start = res_str.find("{")
-        end = res_str.rfind("}")
-        if start != -1 and end != -1:
-            summary_turn = json.loads(res_str[start:end+1])
-            if "role" in summary_turn and "content" in summary_turn:
-                dlg_data["dialogue"].append(summary_turn)
-                return dlg_data
-    except:
-        pass
+    # 파싱 시도 (객체 하나, 잘린 턴은 쓰지 않음)
+    summary_turn = extract_json(res_str, allow_partial=False)
+    if "role" in summary_turn and "content" in summary_turn:
+        dlg_data["dialogue"].append(summary_turn)
     return dlg_data # 실패하면 원본 반환
 
+def continue_dialogue(profile_str: str, dlg_data: Dict, doctor_style: str, user_style: str,
+                      usage: Optional[Counter] = None) -> Tuple[Dict, List[str]]:
+    """
+    빠진 문진 항목만 이어서 질문하도록 teacher에게 요청 후, summary를 새로 붙임
+    - 끝의 Assistant 턴(기존 summary 등)은 떼고 User 턴에서 이어 붙임
+    - 새 턴은 Assistant로 시작해 번갈아 등장해야 하며, 마지막 Assistant 질문에 답이 없으면 버림
+    반환: (수선된 dlg_data, 요청한 누락 intent 목록)
+    """
+    dlg = dlg_data["dialogue"]
+    while dlg and isinstance(dlg[-1], dict) and dlg[-1].get("role") == "assistant":
+        dlg.pop()
+    missing = sorted(REQUIRED_INTENTS - intent_coverage(dlg))
+    if missing:
+        prompt = CONTINUE_DIALOGUE_PROMPT.format(
+            profile_json=profile_str,
+            doctor_style=doctor_style,
+            user_style=user_style,
+            dialogue_json=json.dumps(dlg, ensure_ascii=False),
+            missing_intents=", ".join(missing),
+        )
+        res_str = call_llm(prompt, temperature=DIALOGUE_TEMP, out_tokens=REPAIR_OUT_TOKENS, usage=usage)
+        new_turns = extract_json(res_str).get("dialogue")
+        if isinstance(new_turns, list):
+            # 역할 교대가 깨지는 지점 이전까지만 사용
+            valid = []
+            for i, turn in enumerate(new_turns):
+                expected = "assistant" if i % 2 == 0 else "user"
+                if not isinstance(turn, dict) or turn.get("role") != expected:
+                    break
+                if expected == "assistant":
+                    if "summary" in str(turn.get("intent", "")).lower():
+                        break
+                    turn["content"] = sanitize_single_question(turn.get("content", ""))
+                valid.append(turn)
+            if len(valid) % 2 == 1:
+                valid.pop()
+            dlg.extend(valid)
+
+    dlg_data["dialogue"] = dlg
+    return append_summary(profile_str, dlg_data, usage=usage), missing
+
+# ==========================================
+# [Seed 스트리밍]
+# ==========================================
+def stream_seeds(path: str, done_keys: Set[str], stats: Counter) -> Iterator[Dict]:
+    """
+    시드 파일을 스트리밍하면서 증분 dedup
+    - complaint 정규화 키 기준으로 처음 본 시드만 통과
+    - 이미 생성된 시드(done_keys)는 셔플 버퍼에 넣기 전에 걸러냄
+    """
+    seen: Set[str] = set()
+    for s in iter_json_items(path):
+        if not isinstance(s, dict) or "complaint" not in s:
+            continue
+        k = normalize_key(s["complaint"])
+        if not k or k in seen:
+            continue
+        seen.add(k)
+        stats["seeds_unique"] += 1
+        if k in done_keys:
+            stats["skip_done"] += 1
+            continue
+        yield s
+
+
+# ==========================================
+# [실행 통계]
+# ==========================================
+def save_run_stats(run_id: str, started_at: str, stats: Counter, finished: bool) -> None:
+    """
+    실행별 통계 스냅샷을 RUN_STATS_FILE에 append (같은 run_id는 마지막 줄이 최신)
+    - 중간에 죽어도 마지막 autosave 시점까지의 실패/수선 통계는 남음
+    """
+    row = {
+        "run_id": run_id,
+        "started_at": started_at,
+        "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "finished": finished,
+        "stats": dict(stats),
+        "repair_stats": dict(repair_stats),
+        "llm_stats": dict(llm_stats),
+    }
+    try:
+        with open(RUN_STATS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"[Run Stats] write failed: {e}")
+
+
 # ==========================================
 # [Main Logic]
 # ==========================================
-def process_case(case_id: int, seed: Dict) -> Tuple[Optional[Dict], str]:
+def process_case(case_id: int, seed: Dict, doctor_style: Optional[str] = None, user_style: Optional[str] = None,
+                 usage: Optional[Counter] = None) -> Tuple[Optional[Dict], str]:
+    """usage를 주면 이 케이스의 모든 LLM 호출 토큰 수를 누적 (스케줄러 비용 추정용)"""
+    if usage is None:
+        usage = Counter()
     # 1. Profile
     p_prompt = PROFILE_PROMPT_TPL.format(
         category=seed.get("category",""),
@@ -350,38 +638,91 @@ def process_case(case_id: int, seed: Dict) -> Tuple[Optional[Dict], str]:
         risk=seed.get("risk",""),
         diagnosis_guess=seed.get("diagnosis_guess","")
     )
-    p_raw = call_llm(p_prompt, temperature=PROFILE_TEMP)
-    profile = extract_json(p_raw)
+    with tracer.span("profile"):
+        p_raw = call_llm(p_prompt, temperature=PROFILE_TEMP, out_tokens=PROFILE_OUT_TOKENS, usage=usage)
+        profile = extract_json(p_raw)
     
     # Profile Validation (간소화)
     if "profile" not in profile or "symptoms" not in profile:
+        dump_parse_failure("profile", p_raw)
         return None, "profile_struct_error"
 
     profile_str = json.dumps(profile, ensure_ascii=False, indent=2)
 
     # 2. Dialogue Generation
+    doctor_style = doctor_style or random.choice(DOCTOR_STYLES)
+    user_style = user_style or random.choice(USER_STYLES)
     d_prompt = DIALOGUE_PROMPT_TPL.format(
         profile_json=profile_str,
-        doctor_style=random.choice(DOCTOR_STYLES),
-        user_style=random.choice(USER_STYLES)
+        doctor_style=doctor_style,
+        user_style=user_style,
+        intent_labels=", ".join(sorted(HPI_INTENTS) + ["history", "meds", "summary"]),
+        required_intents=", ".join(sorted(REQUIRED_INTENTS)),
     )
-    d_raw = call_llm(d_prompt, temperature=DIALOGUE_TEMP)
-    dlg_data = extract_json(d_raw)
-
-    # ★ 1차 수선: 물음표 2개 이상이면 잘라버림 (LLM 다시 부르지 않고 로직으로 해결)
-    if "dialogue" in dlg_data and isinstance(dlg_data["dialogue"], list):
-        for turn in dlg_data["dialogue"]:
-            if turn.get("role") == "assistant":
-                turn["content"] = sanitize_single_question(turn.get("content", ""))
-
-    # 3. Validation
-    ok, reason = validate_dialogue(dlg_data)
+    dlg_usage: Counter = Counter()
+    with tracer.span("dialogue"):
+        d_raw = call_llm(d_prompt, temperature=DIALOGUE_TEMP, out_tokens=DIALOGUE_OUT_TOKENS, usage=dlg_usage)
+        dlg_data = extract_json(d_raw)
+    usage.update(dlg_usage)
+    # 이 케이스 이전까지의 대화 1건당 평균 수선 비용 (이어쓰기 절약 추정의 기준, 이번 수선 비용은 포함하지 않음)
+    prior_repair = repair_stats["repair_tokens"] / repair_stats["dialogue_cases"] if repair_stats["dialogue_cases"] else 0.0
+    repair_stats["dialogue_cases"] += 1
+    repair_stats["dialogue_tokens"] += sum(dlg_usage.values())
+    if "dialogue" not in dlg_data:
+        dump_parse_failure("dialogue", d_raw)
+
+    with tracer.span("sanitize_validate"):
+        # ★ 1차 수선: 물음표 2개 이상이면 잘라버림 (LLM 다시 부르지 않고 로직으로 해결)
+        if "dialogue" in dlg_data and isinstance(dlg_data["dialogue"], list):
+            for turn in dlg_data["dialogue"]:
+                if turn.get("role") == "assistant":
+                    before = turn.get("content", "")
+                    turn["content"] = sanitize_single_question(before)
+                    if turn["content"] != before:
+                        repair_stats["sanitize_multi_question"] += 1
+
+        # 3. Validation
+        ok, reason = validate_dialogue(dlg_data)
+
+    # ★ 2차 수선 (a): 문진 항목이 빠진 경우 -> 빠진 항목만 이어서 묻고 summary 다시 붙이기 (전체 재생성 대신)
+    if not ok and reason in ("no_summary", "ends_with_user", "missing_intents") \
+            and REQUIRED_INTENTS - intent_coverage(dlg_data["dialogue"]):
+        cont_usage: Counter = Counter()
+        repair_stats["continue_dialogue"] += 1
+        with tracer.span("repair", kind="continue_dialogue", reason=reason) as sp:
+            dlg_data, missing = continue_dialogue(profile_str, dlg_data, doctor_style, user_style, usage=cont_usage)
+            ok, reason = validate_dialogue(dlg_data)
+            sp["missing"] = missing
+        usage.update(cont_usage)
+        cont_tokens = sum(cont_usage.values())
+        repair_stats["continue_tokens"] += cont_tokens
+        repair_stats["repair_tokens"] += cont_tokens
+        if ok:
+            # 대안(대화 전체 재생성) 비용 = 이번 대화 생성 토큰 + 이전 케이스들의 대화 1건당 평균 수선 토큰
+            # 이어쓰기 프롬프트는 프로필 + 대화 전체를 다시 넣으므로 더 비쌀 수도 있음 -> 절약 / 추가 비용을 따로 집계
+            repair_stats["continue_dialogue_ok"] += 1
+            net = round(sum(dlg_usage.values()) + prior_repair - cont_tokens)
+            if net >= 0:
+                repair_stats["continue_saved_tokens"] += net
+            else:
+                repair_stats["continue_extra_tokens"] += -net
+            cost = f"saved {net} tokens vs regeneration" if net >= 0 else f"{-net} extra tokens vs regeneration"
+        else:
+            cost = f"spent {cont_tokens} tokens"
+        print(f"[{case_id}] Continue Dialogue for {missing} -> {reason} ({cost})")
 
-    # ★ 2차 수선: Summary가 없거나 User로 끝난 경우 -> Summary 턴만 생성해서 붙이기
+    # ★ 2차 수선 (b): Summary가 없거나 User로 끝난 경우 -> Summary 턴만 생성해서 붙이기
     if not ok and (reason == "no_summary" or reason == "ends_with_user"):
         print(f"[{case_id}] Append Summary...")
-        dlg_data = append_summary(profile_str, dlg_data)
-        ok, reason = validate_dialogue(dlg_data) # 재검증
+        repair_stats["append_summary"] += 1
+        sum_usage: Counter = Counter()
+        with tracer.span("repair", kind="append_summary", reason=reason):
+            dlg_data = append_summary(profile_str, dlg_data, usage=sum_usage)
+            ok, reason = validate_dialogue(dlg_data) # 재검증
+        usage.update(sum_usage)
+        repair_stats["repair_tokens"] += sum(sum_usage.values())
+        if ok:
+            repair_stats["append_summary_ok"] += 1
 
     if not ok:
         # 최후의 수단: 그냥 덮어놓고 리트라이 (전체 재생성보다는 나음)
@@ -404,22 +745,6 @@ def main():
         print(f"Input not found: {INPUT_FILE}")
         return
 
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        seeds = json.load(f)
-
-    # Dedup & Shuffle
-    unique_map = {}
-    for s in seeds:
-        if "complaint" not in s:
-            continue
-        k = normalize_key(s["complaint"])
-        if k and k not in unique_map:
-            unique_map[k] = s
-    seeds = list(unique_map.values())
-    random.shuffle(seeds)
-
-    print(f"Loaded {len(seeds)} unique seeds.")
-
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
 
     # Resume Logic (연속 case_id 유지)
@@ -427,52 +752,100 @@ def main():
     start_id = 1
 
     if OVERWRITE_OUTPUT:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as _:
-            pass
+        remove_dataset(OUTPUT_FILE)
+        # 스케줄러 상태(SCHED_STATE_FILE)는 지우지 않음: 수락률 / 비용 추정치는 유지, 다양성 하한용 레코드 수만 아래에서 reset
+        if os.path.exists(RUN_STATS_FILE):
+            os.remove(RUN_STATS_FILE)
         print(f"Overwrite output: {OUTPUT_FILE}")
     else:
-        if os.path.exists(OUTPUT_FILE):
-            with open(OUTPUT_FILE, "r", encoding="utf-8") as f_in:
-                for line in f_in:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = json.loads(line)
-                        cid = obj.get("case_id")
-                        if isinstance(cid, int):
-                            start_id = max(start_id, cid + 1)
-
-                        comp = obj.get("seed_info", {}).get("complaint", "")
-                        k = normalize_key(comp)
-                        if k:
-                            done_keys.add(k)
-                    except:
-                        pass
+        # 평문 JSONL + 압축 샤드 모두 스트리밍으로 읽음
+        n_done = 0
+        for obj in iter_records(OUTPUT_FILE):
+            try:
+                cid = obj.get("case_id")
+                if isinstance(cid, int):
+                    start_id = max(start_id, cid + 1)
+
+                comp = obj.get("seed_info", {}).get("complaint", "")
+                k = normalize_key(comp)
+                if k:
+                    done_keys.add(k)
+                n_done += 1
+            except:
+                pass
+        if n_done:
             print(f"Resuming from case_id {start_id}. done_seeds={len(done_keys)}")
 
+    if TRACE_FILE:
+        tracer.start(TRACE_FILE)
+        print(f"Tracing to {TRACE_FILE}")
+
+    # 모델 preload + 포트별 준비 상태 보고 (첫 요청이 cold load로 TIMEOUT 나는 것 방지)
+    if WARMUP:
+        if not warmup_endpoints():
+            print("No endpoint is ready. Check the LLM servers / SSH tunnels.")
+            tracer.close()
+            return
+
     success = 0
     stats = Counter()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    run_id = f"{started_at}-{os.getpid()}"
 
-    with open(OUTPUT_FILE, "a", encoding="utf-8") as f_out:
-        for seed in seeds:
+    # Dedup & Shuffle (스트리밍 + 셔플 버퍼: 풀 크기와 무관하게 첫 케이스가 바로 시작됨)
+    shuffle_rng = random.Random(RANDOM_SEED)
+    seeds = shuffle_buffer(stream_seeds(INPUT_FILE, done_keys, stats), SEED_SHUFFLE_BUFFER, shuffle_rng)
+    print(f"Streaming seeds from {INPUT_FILE} (shuffle_buffer={SEED_SHUFFLE_BUFFER})")
+
+    # 스케줄러: 셔플된 스트림 위에서 window 단위로 시드 순서 + 스타일 쌍 선택 (추정치는 꺼져 있어도 계속 학습)
+    scheduler = StyleScheduler(DOCTOR_STYLES, USER_STYLES, min_share=STYLE_MIN_SHARE, rng=random.Random(RANDOM_SEED))
+    n_arms = scheduler.load(SCHED_STATE_FILE)
+    if OVERWRITE_OUTPUT:
+        scheduler.reset_records()
+    if n_arms:
+        print(f"Scheduler state loaded: arms={n_arms}, tries={scheduler.total[0]:.0f}, accepted={scheduler.total[1]:.0f}"
+              f"{' (diversity counts reset for the new dataset)' if OVERWRITE_OUTPUT else ''}")
+    if SCHEDULER:
+        work = scheduler.order(seeds, window=SCHED_WINDOW)
+    else:
+        work = ((s, random.choice(DOCTOR_STYLES), random.choice(USER_STYLES)) for s in seeds)
+
+    writer = DatasetWriter(
+        OUTPUT_FILE,
+        compression=OUTPUT_COMPRESSION,
+        flush_every=AUTOSAVE_EVERY,
+        flush_interval=AUTOSAVE_INTERVAL,
+        shard_max_bytes=SHARD_MAX_BYTES,
+    )
+
+    with writer:
+        for seed, doctor_style, user_style in work:
             if MAX_CASES is not None and success >= MAX_CASES:
                 break
 
             k = normalize_key(seed.get("complaint", ""))
-            if k in done_keys:
-                stats["skip_done"] += 1
-                continue
 
             # 성공 수 기반으로 case_id 부여 (문제 없게)
             current_cid = start_id + success
 
             print(f"Processing [{current_cid}] {seed.get('category','')} / {seed.get('diagnosis_guess','')} ...")
-            res, msg = process_case(current_cid, seed)
+            tracer.set_case(current_cid)
+            with tracer.span("case", category=seed.get("category", ""), risk=seed.get("risk", "")) as sp:
+                case_usage: Counter = Counter()
+                no_response = llm_stats["no_response"]
+                res, msg = process_case(current_cid, seed, doctor_style, user_style, usage=case_usage)
+                sp["result"] = msg
+            # 스타일과 무관한 실패는 arm 통계에서 제외: 스타일을 쓰기 전인 profile 단계 실패,
+            # 재시도를 다 써도 응답이 없던 호출(엔드포인트 / 터널 장애)이 낀 케이스
+            if msg != "profile_struct_error" and llm_stats["no_response"] == no_response:
+                scheduler.update(seed, doctor_style, user_style, accepted=res is not None, tokens=sum(case_usage.values()))
+            else:
+                llm_stats["sched_skipped"] += 1
 
             if res:
-                f_out.write(json.dumps(res, ensure_ascii=False) + "\n")
-                f_out.flush()
+                # flush / fsync는 writer가 배치 단위로 처리
+                with tracer.span("write"):
+                    writer.write(res)
 
                 done_keys.add(k)
                 success += 1
@@ -480,23 +853,35 @@ def main():
                 print("  -> Success")
 
                 if AUTOSAVE_EVERY > 0 and success % AUTOSAVE_EVERY == 0:
-                    try:
-                        os.fsync(f_out.fileno())
-                    except:
-                        pass
-                    print(f"  [Auto-Save] success={success}, stats={dict(stats)}")
+                    print(f"  [Auto-Save] success={success}, commits={writer.commits}, stats={dict(stats)}")
+                    save_run_stats(run_id, started_at, stats, finished=False)
+                    scheduler.save(SCHED_STATE_FILE)
             else:
                 stats[msg] += 1
                 print(f"  -> Fail: {msg}")
 
             time.sleep(0.5)
 
-        try:
-            os.fsync(f_out.fileno())
-        except:
-            pass
-
+    tracer.close()
+    save_run_stats(run_id, started_at, stats, finished=True)
+    scheduler.save(SCHED_STATE_FILE)
     print(f"Done. success={success}, stats={dict(stats)}")
+    print(f"Repair stats={dict(repair_stats)}")
+    if repair_stats["continue_dialogue_ok"]:
+        saved = repair_stats["continue_saved_tokens"]
+        extra = repair_stats["continue_extra_tokens"]
+        net = saved - extra
+        print(f"Continuation vs full regeneration ({repair_stats['continue_dialogue_ok']} repaired cases): "
+              f"saved {saved} tokens, cost {extra} extra tokens -> "
+              f"{'net saving' if net >= 0 else 'net cost'} {abs(net)} tokens "
+              f"({abs(net) / repair_stats['continue_dialogue_ok']:.0f} per repaired case)")
+    print(f"LLM stats={dict(llm_stats)}")
+    for key, n, rate, tok in scheduler.summary():
+        print(f"  Style {key}: tries={n}, accept={rate:.0%}, tokens/case={tok:.0f}")
+    for port, st in port_state.items():
+        ewma = st.get("tok_latency_ewma")
+        print(f"  Port {port}: num_ctx={st.get('num_ctx')}, cold_loads={st.get('cold_loads', 0)}, "
+              f"warm_latency_ewma={'-' if ewma is None else f'{ewma * 1000:.0f}ms/token'}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,719 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import io
+import gzip
+import zlib
+import hashlib
+import itertools
+import time
+import random
+import struct
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard as zstd  # 선택 의존성 (compression="zstd" 일 때만 필요)
+except ImportError:
+    zstd = None
+
+# idx 없이 샤드를 한 스트림으로 풀 때 '잘린 꼬리'로 보고 멈출 에러 (그 외 에러는 그대로 올림)
+_TRUNCATION_ERRORS: Tuple[type, ...] = (EOFError, zlib.error, gzip.BadGzipFile) + ((zstd.ZstdError,) if zstd is not None else ())
+
+# ==========================================
+# [설정]
+# ==========================================
+COMPRESSIONS = {"gzip": "gz", "zstd": "zst"}
+DEFAULT_SHARD_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_FRAME_MAX_BYTES = 1024 * 1024   # 압축 프레임 하나에 넣는 평문 상한 (프레임 경계는 커밋이 아니라 크기로)
+READ_CHUNK = 1024 * 1024
+FINGERPRINT_BYTES = 256      # cursor 직전 바이트 해시 (파일이 새로 쓰였는지 판별)
+
+_WS_COMMA = re.compile(r"[\s,]*")
+
+
+# ==========================================
+# [샤드 / 압축 유틸리티]
+# ==========================================
+def shard_path(path: str, index: int, compression: str) -> str:
+    """medical_chat_data.jsonl -> medical_chat_data.jsonl.00003.zst"""
+    return f"{path}.{index:05d}.{COMPRESSIONS[compression]}"
+
+
+def list_shards(path: str) -> List[str]:
+    """path에 딸린 압축 샤드 목록 (샤드 번호 순)"""
+    d = os.path.dirname(path) or "."
+    base = os.path.basename(path)
+    pat = re.compile(re.escape(base) + r"\.(\d{5})\.(gz|zst)$")
+    found = []
+    if os.path.isdir(d):
+        for name in os.listdir(d):
+            m = pat.match(name)
+            if m:
+                found.append((int(m.group(1)), os.path.join(d, name)))
+    return [p for _, p in sorted(found)]
+
+
+def _compression_of(shard: str) -> str:
+    return "zstd" if shard.endswith(".zst") else "gzip"
+
+
+class _FrameCompressor:
+    """
+    압축 프레임 하나 (gzip 멤버 / zstd 프레임)를 여러 커밋에 걸쳐 이어 씀
+    - sync(): 지금까지 넣은 데이터를 sync flush (Z_SYNC_FLUSH / FLUSH_BLOCK) -> 프레임이 안 닫혀도 여기까지 디코딩 가능
+    - finish(): 프레임 종료 (trailer 기록)
+    """
+
+    def __init__(self, compression: str) -> None:
+        if compression == "gzip":
+            self._c = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._sync_mode = zlib.Z_SYNC_FLUSH
+        else:
+            self._c = zstd.ZstdCompressor(level=6).compressobj()
+            self._sync_mode = zstd.COMPRESSOBJ_FLUSH_BLOCK
+
+    def sync(self, data: bytes) -> bytes:
+        return self._c.compress(data) + self._c.flush(self._sync_mode)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+def _frame_trailer(raw: bytes, compression: str) -> bytes:
+    """
+    sync flush 지점에서 끊긴 프레임을 닫는 꼬리 (append만으로 봉인 -> 다시 압축할 필요 없음)
+    - gzip: 빈 final deflate 블록 + CRC32 / ISIZE
+    - zstd: 크기 0짜리 last raw 블록 (compressobj 프레임은 checksum 없음)
+    """
+    if compression == "gzip":
+        return b"\x03\x00" + struct.pack("<II", zlib.crc32(raw) & 0xFFFFFFFF, len(raw) & 0xFFFFFFFF)
+    return b"\x01\x00\x00"
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    """프레임 하나 풀기 (아직 안 닫힌 프레임은 마지막 sync flush 지점까지)"""
+    if compression == "gzip":
+        return zlib.decompressobj(31).decompress(data)
+    return zstd.ZstdDecompressor().decompressobj().decompress(data)
+
+
+def read_index(shard: str) -> List[Dict[str, Any]]:
+    """
+    <shard>.idx 로드 -> 프레임 목록 (offset, length, records, final)
+    - 커밋마다 한 줄: 같은 offset의 줄은 같은 프레임이 커밋으로 늘어난 것 -> 마지막 줄만 유효
+    - final=False 인 프레임은 아직 열려 있음 (다음 커밋에서 length / records가 늘어날 수 있음)
+      (final 키가 없는 옛 idx는 한 줄이 독립 프레임)
+    - 마지막 줄이 잘려 있으면(쓰는 도중 종료) 무시
+    """
+    entries: List[Dict[str, Any]] = []
+    idx_path = shard + ".idx"
+    if not os.path.exists(idx_path):
+        return entries
+    with open(idx_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            try:
+                e = json.loads(line)
+                entry = {"offset": int(e["offset"]), "length": int(e["length"]), "records": int(e.get("records", 0)),
+                         "final": bool(e.get("final", True))}
+            except Exception:
+                break
+            if entries and entries[-1]["offset"] == entry["offset"]:
+                entries[-1] = entry
+            else:
+                entries.append(entry)
+    return entries
+
+
+def _fsync(f) -> None:
+    try:
+        os.fsync(f.fileno())
+    except OSError:
+        pass
+
+
+def _recover_shard(shard: str) -> int:
+    """
+    이전 실행이 남긴 샤드 정리 -> 유효한 데이터 끝 offset (-1: 이어 쓸 수 없는 샤드, 손대지 않음)
+    - idx가 없거나 읽을 수 있는 항목이 없는데 데이터가 있으면 건드리지 않음
+      (idx 없는 샤드도 iter_shard가 통째로 읽음 -> 잘라내면 데이터 손실, writer는 다음 번호로 새 샤드 시작)
+    - idx에 없는 꼬리(커밋 도중 종료된 프레임 조각)는 잘라냄
+    - 닫히지 않은 마지막 프레임은 trailer를 append해서 봉인 (idx 없이 이어 풀어도 다음 프레임까지 읽히도록)
+      (봉인 도중 죽어도 idx는 봉인 전 길이 그대로 -> 다음 실행이 다시 잘라내고 봉인)
+    - 잘린 idx 꼬리 정리 + 같은 프레임의 커밋 줄을 프레임당 한 줄로 압축
+    """
+    comp = _compression_of(shard)
+    entries = read_index(shard)
+    if not entries and os.path.getsize(shard) > 0:
+        return -1
+    end = entries[-1]["offset"] + entries[-1]["length"] if entries else 0
+    if os.path.getsize(shard) > end:
+        with open(shard, "r+b") as f:
+            f.truncate(end)
+    sealed = False
+    if entries and not entries[-1]["final"] and (comp == "gzip" or zstd is not None):
+        e = entries[-1]
+        with open(shard, "r+b") as f:
+            f.seek(e["offset"])
+            trailer = _frame_trailer(_decompress(f.read(e["length"]), comp), comp)
+            f.seek(end)
+            f.write(trailer)
+            f.flush()
+            _fsync(f)
+        end += len(trailer)
+        entries[-1] = dict(e, length=e["length"] + len(trailer), final=True)
+        sealed = True
+
+    idx_path = shard + ".idx"
+    n_lines = 0
+    if os.path.exists(idx_path):
+        with open(idx_path, "r", encoding="utf-8") as f:
+            n_lines = sum(1 for _ in f)
+    if sealed or n_lines != len(entries):
+        tmp = idx_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in entries:
+                f.write(json.dumps(e) + "\n")
+            f.flush()
+            _fsync(f)
+        os.replace(tmp, idx_path)
+    return end
+
+
+# ==========================================
+# [Writer: group commit]
+# ==========================================
+class DatasetWriter:
+    """
+    JSONL 데이터셋 writer (group commit)
+    - write()는 버퍼에만 쌓고, flush_every 건 또는 flush_interval 초마다 한 번에 write + flush + fsync
+    - compression=None 이면 path에 평문 JSONL append (기존 포맷 그대로)
+    - compression="gzip" | "zstd" 이면 샤드에 압축 프레임으로 append
+      * 커밋(내구성)과 프레임 경계는 별개: 커밋은 열린 프레임에 sync flush로 이어 쓰고,
+        프레임은 평문 frame_max_bytes가 찼을 때만 닫음 (커밋마다 독립 프레임이면 반복되는 텍스트의 압축률이 크게 떨어짐)
+      * 커밋마다 <shard>.idx 에 (프레임 offset, 지금까지 length, records, final) 한 줄 -> 리더가 프레임 단위로 seek 가능
+      * 샤드가 shard_max_bytes를 넘으면 (프레임을 닫은 뒤) 다음 번호로 회전
+      * idx는 데이터 fsync 이후에 기록하므로, 중간에 죽어도 idx에 있는 지점까지는 항상 디코딩 가능
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[str] = None,
+        flush_every: int = 10,
+        flush_interval: float = 5.0,
+        shard_max_bytes: int = DEFAULT_SHARD_MAX_BYTES,
+        frame_max_bytes: int = DEFAULT_FRAME_MAX_BYTES,
+    ) -> None:
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression: {compression} (None | gzip | zstd)")
+        if compression == "zstd" and zstd is None:
+            raise RuntimeError("compression='zstd' 에는 zstandard 모듈이 필요함 (pip install zstandard)")
+
+        self.path = path
+        self.compression = compression
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.shard_max_bytes = shard_max_bytes
+        self.frame_max_bytes = frame_max_bytes
+
+        self.records_written = 0
+        self.commits = 0
+
+        self._buf: List[bytes] = []
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._f = None
+        self._idx = None
+        self._shard_no = -1
+        self._frame: Optional[_FrameCompressor] = None   # 열린 프레임 (없으면 다음 커밋이 새 프레임 시작)
+        self._frame_offset = 0
+        self._frame_raw = 0
+        self._frame_records = 0
+        if compression is None:
+            self._f = open(path, "ab")
+        else:
+            self._open_last_shard()
+
+        # 레코드가 뜸하게 들어와도 flush_interval 안에는 디스크에 반영되도록
+        self._stop = threading.Event()
+        self._ticker: Optional[threading.Thread] = None
+        if flush_interval and flush_interval > 0:
+            self._ticker = threading.Thread(target=self._tick, name="DatasetWriter-flush", daemon=True)
+            self._ticker.start()
+
+    # ---------- shard 관리 ----------
+    def _open_last_shard(self) -> None:
+        """
+        마지막 샤드에 이어서 씀
+        - 샤드 번호는 압축 방식과 무관하게 하나의 순서 (cursor의 shard 번호가 겹치지 않도록)
+        - 마지막 샤드가 다른 압축 방식이면 (OUTPUT_COMPRESSION 변경) 그 다음 번호로 새 샤드 시작
+        - 이전 실행이 닫지 못한 프레임은 봉인한 뒤 새 프레임부터 이어 씀
+        """
+        shards = list_shards(self.path)
+        if shards:
+            last = shards[-1]
+            self._shard_no = shard_number(last)
+            end = _recover_shard(last)
+            if _compression_of(last) == self.compression and 0 <= end < self.shard_max_bytes:
+                self._f = open(last, "ab")
+                self._idx = open(last + ".idx", "a", encoding="utf-8")
+                return
+        self._rotate()
+
+    def _rotate(self) -> None:
+        self._finish_frame()
+        if self._f is not None:
+            self._f.close()
+            self._idx.close()
+        self._shard_no += 1
+        shard = shard_path(self.path, self._shard_no, self.compression)
+        self._f = open(shard, "ab")
+        self._idx = open(shard + ".idx", "a", encoding="utf-8")
+
+    # ---------- public ----------
+    def write(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self._buf.append(line)
+            if len(self._buf) >= self.flush_every or time.monotonic() - self._last_commit >= self.flush_interval > 0:
+                self._commit()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._stop.set()
+        if self._ticker is not None:
+            self._ticker.join()
+        with self._lock:
+            self._commit()
+            self._finish_frame()
+            self._f.close()
+            if self._idx is not None:
+                self._idx.close()
+            self._closed = True
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------- 내부 ----------
+    def _tick(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._buf and time.monotonic() - self._last_commit >= self.flush_interval:
+                    self._commit()
+
+    def _commit(self) -> None:
+        """버퍼 전체를 한 번의 write + fsync로 반영 (lock 보유 상태에서 호출)"""
+        self._last_commit = time.monotonic()
+        if not self._buf:
+            return
+        data = b"".join(self._buf)
+        n = len(self._buf)
+        self._buf = []
+
+        if self.compression is None:
+            self._f.write(data)
+            self._f.flush()
+            _fsync(self._f)
+        else:
+            if self._frame is None:
+                self._frame = _FrameCompressor(self.compression)
+                self._frame_offset = self._f.tell()
+                self._frame_raw = 0
+                self._frame_records = 0
+            self._frame_raw += len(data)
+            self._frame_records += n
+            if self._frame_raw >= self.frame_max_bytes:
+                self._write_frame(self._frame.sync(data) + self._frame.finish(), final=True)
+                if self._f.tell() >= self.shard_max_bytes:
+                    self._rotate()
+            else:
+                self._write_frame(self._frame.sync(data), final=False)
+
+        self.records_written += n
+        self.commits += 1
+
+    def _finish_frame(self) -> None:
+        """열린 프레임을 닫음 (close / 샤드 회전 시)"""
+        if self._frame is not None:
+            self._write_frame(self._frame.finish(), final=True)
+
+    def _write_frame(self, chunk: bytes, final: bool) -> None:
+        """프레임 조각 append + fsync 후 idx에 이 프레임의 현재 길이 기록"""
+        self._f.write(chunk)
+        self._f.flush()
+        _fsync(self._f)
+        length = self._f.tell() - self._frame_offset
+        self._idx.write(json.dumps({"offset": self._frame_offset, "length": length, "records": self._frame_records, "final": final}) + "\n")
+        self._idx.flush()
+        _fsync(self._idx)
+        if final:
+            self._frame = None
+
+
+# ==========================================
+# [Reader]
+# ==========================================
+def _iter_lines(data: bytes) -> Iterator[Dict[str, Any]]:
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except Exception:
+            pass
+
+
+def iter_shard(shard: str) -> Iterator[Dict[str, Any]]:
+    """
+    압축 샤드 하나를 프레임 단위로 스트리밍
+    - idx가 있으면 idx에 기록된 프레임만 읽음 (커밋 안 된 꼬리 무시)
+    - idx가 없으면 샤드 전체를 한 스트림으로 풀어봄 (gzip 멤버 / zstd 프레임 연결은 표준 포맷)
+    """
+    comp = _compression_of(shard)
+    if comp == "zstd" and zstd is None:
+        raise RuntimeError("zstandard 모듈이 없어 .zst 샤드를 읽을 수 없음 (pip install zstandard)")
+    entries = read_index(shard)
+    with open(shard, "rb") as f:
+        if entries:
+            for e in entries:
+                f.seek(e["offset"])
+                frame = f.read(e["length"])
+                try:
+                    data = _decompress(frame, comp)
+                except Exception:
+                    continue
+                yield from _iter_lines(data)
+            return
+
+        if comp == "gzip":
+            stream = gzip.GzipFile(fileobj=f)
+        else:
+            # zstd stream_reader는 줄 단위 iteration을 지원하지 않음 (io.UnsupportedOperation) -> BufferedReader로 감쌈
+            stream = io.BufferedReader(zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True))
+        try:
+            for line in stream:
+                try:
+                    yield json.loads(line)
+                except Exception:
+                    pass
+        except _TRUNCATION_ERRORS:
+            pass  # 잘린 꼬리 / 봉인 안 된 프레임
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    데이터셋 전체 스트리밍: 평문 JSONL(path) -> 압축 샤드(path.NNNNN.gz|zst) 순서
+    - 파싱 안 되는 줄은 건너뜀 (resume 로직과 동일한 관용)
+    """
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except Exception:
+                    pass
+    for shard in list_shards(path):
+        yield from iter_shard(shard)
+
+
+def shard_number(shard: str) -> int:
+    return int(shard.rsplit(".", 2)[-2])
+
+
+def new_cursor() -> Dict[str, int]:
+    """
+    증분 처리용 읽기 위치
+    - plain: 평문 JSONL에서 다음에 읽을 byte offset
+    - shard / frame / line: 압축 샤드 번호, 샤드 안 프레임 번호, 프레임 안 줄 번호
+    """
+    return {"plain": 0, "shard": 0, "frame": 0, "line": 0}
+
+
+def iter_records_since(path: str, cursor: Optional[Dict[str, int]] = None) -> Iterator[Tuple[Dict[str, Any], Dict[str, int]]]:
+    """
+    cursor 이후에 추가된 레코드만 스트리밍 -> (record, 이 레코드까지 소비한 cursor)
+    - 평문 파일은 개행으로 끝난 줄까지만 읽음 (쓰는 중인 꼬리 줄은 다음 실행에서 처리)
+    - 샤드는 idx에 커밋된 지점까지만 읽음
+      (writer가 아직 열어 둔 마지막 프레임은 cursor가 그 프레임 안의 줄 번호에 머묾 -> 다음 호출에서 이어서 읽음)
+    - 반환되는 cursor는 매번 새 dict (그대로 저장해도 됨)
+    """
+    cur = dict(new_cursor(), **(cursor or {}))
+
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            f.seek(cur["plain"])
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                cur["plain"] += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except Exception:
+                    continue
+                yield rec, dict(cur)
+
+    shards = list_shards(path)
+    for shard in shards:
+        no = shard_number(shard)
+        if no < cur["shard"]:
+            continue
+        if no > cur["shard"]:
+            cur.update(shard=no, frame=0, line=0)
+        comp = _compression_of(shard)
+        entries = read_index(shard)
+        if not entries:
+            # idx 없는 샤드는 통째로 프레임 0으로 취급
+            for j, rec in enumerate(iter_shard(shard)):
+                if j < cur["line"]:
+                    continue
+                cur["line"] = j + 1
+                yield rec, dict(cur)
+            continue
+        with open(shard, "rb") as f:
+            for k in range(cur["frame"], len(entries)):
+                e = entries[k]
+                f.seek(e["offset"])
+                try:
+                    lines = _decompress(f.read(e["length"]), comp).splitlines()
+                except Exception:
+                    lines = []
+                for j in range(cur["line"], len(lines)):
+                    cur["line"] = j + 1
+                    line = lines[j].strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except Exception:
+                        continue
+                    yield rec, dict(cur)
+                if not e["final"] and k == len(entries) - 1 and shard == shards[-1]:
+                    break  # 아직 열린 프레임 (다음 커밋에서 늘어날 수 있음)
+                cur.update(frame=k + 1, line=0)
+
+
+def fingerprint(path: str, cursor: Dict[str, int]) -> str:
+    """
+    cursor 직전 내용의 해시 -> 파일이 덮어써졌거나 줄어들었으면 값이 달라지므로 cursor를 버리고 처음부터 다시 읽어야 함
+    (Analyzer 캐시 / SFT export 상태)
+    - 평문: 직전 FINGERPRINT_BYTES 바이트
+    - 샤드: shard / frame / line 번호 + 직전 프레임의 idx 항목 + 현재 프레임의 앞 FINGERPRINT_BYTES 바이트(풀린 내용)와
+      마지막으로 읽은 줄 (프레임 0 안의 cursor도 구분 / 열린 프레임이 커져도 이 값들은 그대로)
+    """
+    h = hashlib.sha1()
+    offset = cursor["plain"]
+    if offset > 0:
+        if not os.path.exists(path) or os.path.getsize(path) < offset:
+            return "missing"
+        with open(path, "rb") as f:
+            start = max(0, offset - FINGERPRINT_BYTES)
+            f.seek(start)
+            h.update(f.read(offset - start))
+    if cursor["shard"] == 0 and cursor["frame"] == 0 and cursor["line"] == 0:
+        return h.hexdigest()
+
+    shards = [sh for sh in list_shards(path) if shard_number(sh) == cursor["shard"]]
+    if not shards:
+        return "missing"
+    h.update(json.dumps([cursor["shard"], cursor["frame"], cursor["line"]]).encode())
+    entries = read_index(shards[0])
+    if cursor["frame"] > 0:
+        if len(entries) < cursor["frame"]:
+            return "missing"
+        e = entries[cursor["frame"] - 1]
+        h.update(json.dumps({"offset": e["offset"], "length": e["length"], "records": e["records"]}).encode())
+    if cursor["line"] > 0:
+        if entries:
+            if len(entries) <= cursor["frame"]:
+                return "missing"
+            e = entries[cursor["frame"]]
+            with open(shards[0], "rb") as f:
+                f.seek(e["offset"])
+                try:
+                    data = _decompress(f.read(e["length"]), _compression_of(shards[0]))
+                except Exception:
+                    return "missing"
+            lines = data.splitlines()
+            h.update(str(e["offset"]).encode())
+        else:
+            # idx 없는 샤드: iter_records_since와 같이 레코드 순번 기준
+            lines = [json.dumps(r, ensure_ascii=False).encode() for r in itertools.islice(iter_shard(shards[0]), cursor["line"])]
+            data = b"\n".join(lines)
+        if len(lines) < cursor["line"]:
+            return "missing"
+        h.update(data[:FINGERPRINT_BYTES])
+        h.update(lines[cursor["line"] - 1])
+    return h.hexdigest()
+
+
+def remove_dataset(path: str) -> None:
+    """평문 파일 + 모든 샤드/idx 삭제 (OVERWRITE_OUTPUT 용)"""
+    for shard in list_shards(path):
+        for p in (shard, shard + ".idx"):
+            if os.path.exists(p):
+                os.remove(p)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# ==========================================
+# [Seed 스트리밍 로더]
+# ==========================================
+def _skip_item(buf: str, pos: int, state: List[Any]) -> int:
+    """
+    깨진 배열 항목 건너뛰기: 문자열 안의 괄호는 무시하고 배열 레벨의 ',' 또는 배열을 닫는 ']' 위치를 찾음
+    - buf 끝까지 못 찾으면 -1 (state = [depth, in_string, escape] 가 다음 청크로 이어짐)
+    """
+    depth, in_str, esc = state
+    for i in range(pos, len(buf)):
+        c = buf[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            depth += 1
+        elif c in "}]":
+            if depth > 0:
+                depth -= 1
+            elif c == "]":
+                return i
+            # 배열 레벨의 짝 없는 '}'는 깨진 항목의 일부로 보고 그냥 지나감
+        elif c == "," and depth == 0:
+            return i
+    state[:] = [depth, in_str, esc]
+    return -1
+
+
+def iter_json_items(path: str, chunk_size: int = READ_CHUNK, max_item_chars: int = 4 * READ_CHUNK) -> Iterator[Any]:
+    """
+    JSON 배열 파일([...]) 또는 JSONL 파일을 항목 단위로 스트리밍
+    - 배열: chunk_size 단위로 읽으면서 raw_decode로 항목 하나씩 디코딩 (파일 전체를 메모리에 올리지 않음)
+    - JSONL: 줄 단위 json.loads
+    - 깨진 항목 / 줄은 건너뛰고 끝에 개수와 위치를 경고로 출력
+      (배열 항목이 max_item_chars를 넘어도 디코딩되지 않으면 깨진 것으로 보고 다음 ','까지 건너뜀 -> 메모리 상한 유지)
+    - 배열 끝이 잘린 파일(autosave 도중 종료 등)은 마지막 온전한 항목까지 반환 (잘린 항목은 skip으로 집계)
+    """
+    dec = json.JSONDecoder()
+    skipped: List[int] = []
+    unit = "char offset"
+    to_eof = False
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            buf = f.read(chunk_size)
+            eof = len(buf) < chunk_size
+            pos = _WS_COMMA.match(buf, 0).end()
+            while pos >= len(buf) and not eof:
+                more = f.read(chunk_size)
+                eof = len(more) < chunk_size
+                buf += more
+                pos = _WS_COMMA.match(buf, 0).end()
+
+            if not buf.startswith("[", pos):
+                # JSONL: 처음부터 줄 단위로 다시 읽음 (위치는 줄 번호)
+                del buf
+                unit = "line"
+                f.seek(0)
+                for lineno, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except Exception:
+                        skipped.append(lineno)
+                return
+
+            base = 0        # buf[0]의 파일 내 문자 offset
+            skipping: Optional[List[Any]] = None
+            pos += 1
+            while True:
+                if skipping is not None:
+                    i = _skip_item(buf, pos, skipping)
+                    if i < 0:
+                        if eof:
+                            to_eof = True
+                            return
+                        base += len(buf)
+                        buf = f.read(chunk_size)
+                        eof = len(buf) < chunk_size
+                        pos = 0
+                        continue
+                    skipping = None
+                    pos = i
+                    if buf[pos] == "]":
+                        return
+                pos = _WS_COMMA.match(buf, pos).end()
+                if pos < len(buf) and buf[pos] == "]":
+                    return
+                try:
+                    if pos >= len(buf):
+                        raise ValueError("need more data")
+                    obj, end = dec.raw_decode(buf, pos)
+                except ValueError:
+                    if eof or len(buf) - pos > max_item_chars:
+                        if pos < len(buf):
+                            skipped.append(base + pos)
+                            skipping = [0, False, False]
+                            continue
+                        return
+                    more = f.read(chunk_size)
+                    eof = len(more) < chunk_size
+                    base += pos
+                    buf = buf[pos:] + more
+                    pos = 0
+                    continue
+                yield obj
+                pos = end
+    finally:
+        if skipped:
+            where = ", ".join(map(str, skipped[:10])) + (" ..." if len(skipped) > 10 else "")
+            tail = "; the last skip ran to end of file, later items may be lost" if to_eof else ""
+            print(f"[Seeds] skipped {len(skipped)} malformed item(s) in {path} ({unit} {where}){tail}")
+
+
+def shuffle_buffer(items: Iterable[Any], size: Optional[int], rng: random.Random) -> Iterator[Any]:
+    """
+    메모리 상한이 있는 셔플 (shuffle buffer)
+    - size개를 채운 뒤부터는 새 항목이 들어올 때마다 버퍼에서 무작위 하나를 내보냄
+    - size가 None이거나 풀 크기 이상이면 전체 셔플과 동일
+    - 같은 rng 시드 + 같은 입력이면 항상 같은 순서 (재현 가능)
+    """
+    buf: List[Any] = []
+    for it in items:
+        if size is None or len(buf) < size:
+            buf.append(it)
+            continue
+        j = rng.randrange(size)
+        yield buf[j]
+        buf[j] = it
+    rng.shuffle(buf)
+    yield from buf
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import json
+from typing import Any, Dict, List, Set, Tuple
+
+# ==========================================
+# [Teacher 출력 JSON 추출기]
+# ==========================================
+# 구조 문자만 regex로 건너뛰며 한 번만 훑음 (일반 문자는 C 레벨에서 skip)
+_STRUCT = re.compile(r'[{}\[\]"\\`]')
+_CLOSE = {"}": "{", "]": "["}
+_CLOSER = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+MAX_RESTARTS = 16   # 짝 불일치/미종결 후보 폐기 후 재탐색 상한 (``` 펜스를 지나면 다시 채움)
+
+
+def _is_record_like(value: Any) -> bool:
+    """설명문 속 '[1]', '[참고]' 같은 값은 후보에서 제외 (object, 또는 object/array만 담은 array만 인정)"""
+    if isinstance(value, dict):
+        return True
+    return isinstance(value, list) and len(value) > 0 and all(isinstance(v, (dict, list)) for v in value)
+
+
+def _is_cut_point(stack: List[str]) -> bool:
+    """
+    partial salvage 절단 위치: 방금 닫힌 값이 '가장 바깥 array의 원소'일 때만
+    (array가 없으면 최상위 object의 멤버) -> 턴 안의 중첩 object가 닫힌 위치에서 자르지 않음
+    """
+    if stack[-1] == "[":
+        return "[" not in stack[:-1]
+    return len(stack) == 1
+
+
+def scan_json(text: str, openers: str = "{[", allow_partial: bool = False) -> Tuple[Any, str]:
+    """
+    응답 문자열에서 첫 번째로 완결되는 최상위 JSON 값(object/array)을 선형 패스로 추출
+    - 문자열 리터럴 안의 괄호/따옴표는 무시 (content에 '}'가 있어도 안전)
+    - ```json 펜스 / 펜스 없는 bare JSON / 앞뒤 설명문 모두 처리
+      (펜스 경계를 만나면 설명문에서 열린 괄호는 버리고 새로 시작)
+    - 후보 시작점에서는 먼저 raw_decode(C 구현)로 한 번에 디코딩 시도 -> 정상 출력은 여기서 끝
+    - 괄호가 균형 있게 닫혔지만 레코드가 아닌 후보('[1]', '[참고]')는 같은 패스에서 버리고 계속 탐색 (재시작 소모 없음)
+    - 괄호 짝이 안 맞거나 문자열 상태가 의심스러운 후보는 버리고 그 후보 시작 바로 다음부터 다시 탐색
+      (설명문의 '"{"' 처럼 따옴표 안 괄호에서 시작한 후보가 뒤쪽 문자열 상태를 뒤집어 놓아도 복구,
+       최대 MAX_RESTARTS번 / ``` 펜스를 지나면 횟수 초기화)
+    - allow_partial=True 이고 끝까지 닫히지 않았으면(출력 잘림) 가장 바깥 array의 마지막 완결 원소까지
+      잘라서 남은 괄호를 닫아 반환 (예: 대화는 마지막 완결 턴까지)
+    - 끝까지 닫히지 않은 후보를 버리고 재탐색할 때, 그 후보 안에서 구조로 열린 중첩 괄호는 새 후보로 받지 않음
+      (잘린 대화 안의 완결 턴 / meta 같은 내부 값이 최상위 결과로 나오지 않도록)
+
+    반환: (value, status) / status = "ok" | "partial" | "fail"
+    """
+    if not text:
+        return None, "fail"
+    pos = 0
+    restarts = 0
+    nested: Set[int] = set()   # 미종결로 버린 후보 안의 중첩 괄호 위치 (후보 시작점에서 제외)
+    while True:
+        value, status, restart = _scan_from(text, pos, openers, allow_partial, nested)
+        if status != "fail" or restart < 0:
+            return value, status
+        # 펜스를 지나 왔으면 그 앞 설명문의 실패는 본문 후보와 무관 -> 예산 초기화
+        restarts = 0 if text.find("```", pos, restart) != -1 else restarts + 1
+        if restarts > MAX_RESTARTS:
+            # 예산 소진 -> 다음 펜스부터 새 예산으로 (펜스가 없으면 포기)
+            restart = text.find("```", restart)
+            if restart == -1:
+                return None, "fail"
+            restarts = 0
+        pos = restart
+
+
+def _scan_from(text: str, pos: int, openers: str, allow_partial: bool, nested: Set[int]) -> Tuple[Any, str, int]:
+    """scan_json 본체: (value, status, 다시 탐색할 위치 | -1) / 미종결 후보로 끝나면 그 중첩 괄호 위치를 nested에 추가"""
+    stack: List[str] = []
+    inner_open: List[int] = []
+    start = -1
+    in_str = False
+    skip_to = -1
+    last_cut = -1
+    last_cut_stack: Tuple[str, ...] = ()
+
+    for m in _STRUCT.finditer(text, pos):
+        i = m.start()
+        if i < skip_to:
+            continue
+        ch = text[i]
+
+        if in_str:
+            if ch == "\\":
+                skip_to = i + 2
+            elif ch == '"':
+                in_str = False
+            continue
+
+        if ch == "`":
+            if text.startswith("```", i):
+                stack = []
+                start = -1
+                last_cut = -1
+                skip_to = i + 3
+            continue
+
+        if not stack:
+            if ch in openers and i not in nested:
+                try:
+                    value = _DECODER.raw_decode(text, i)[0]
+                    if _is_record_like(value):
+                        return value, "ok", -1
+                except ValueError:
+                    pass
+                stack.append(ch)
+                inner_open = []
+                start = i
+                last_cut = -1
+            continue
+
+        if ch == '"':
+            in_str = True
+        elif ch == "{" or ch == "[":
+            stack.append(ch)
+            inner_open.append(i)
+        elif ch in _CLOSE:
+            if stack[-1] != _CLOSE[ch]:
+                # 짝이 안 맞음 -> 후보 폐기
+                return None, "fail", start + 1
+            stack.pop()
+            if not stack:
+                inner = text[start + 1:i]
+                try:
+                    value = json.loads(text[start:i + 1])
+                    if _is_record_like(value):
+                        return value, "ok", -1
+                    # 유효한 JSON이면 문자열 상태도 온전 -> 같은 패스에서 계속
+                    start = -1
+                    continue
+                except ValueError:
+                    pass
+                if '"' not in inner and "{" not in inner and "[" not in inner:
+                    # '[참고]'처럼 따옴표/중첩 괄호 없는 라벨 -> 상태 오염 없음, 같은 패스에서 계속
+                    start = -1
+                    continue
+                return None, "fail", start + 1
+            if _is_cut_point(stack):
+                last_cut = i
+                last_cut_stack = tuple(stack)
+
+    if not stack:
+        return None, "fail", -1
+    if allow_partial and last_cut != -1:
+        closing = "".join(_CLOSER[c] for c in reversed(last_cut_stack))
+        try:
+            return json.loads(text[start:last_cut + 1] + closing), "partial", -1
+        except ValueError:
+            pass
+    # 잘린 후보 -> 문자열 상태가 틀렸을 수 있으니 재탐색하되, 구조로 열린 내부 값은 후보에서 제외
+    nested.update(inner_open)
+    return None, "fail", start + 1
+
+
+def extract_json(text: str, allow_partial: bool = True) -> Dict[str, Any]:
+    """
+    Data Creator용: 객체는 그대로, 리스트만 덜렁 있으면 {"dialogue": [...]}로 감싸서 반환
+    - 잘린 출력은 마지막 완결 턴까지 살려서 반환 (검증 / summary 부착 단계에서 마무리)
+    """
+    value, _ = scan_json(text, "{[", allow_partial)
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, list):
+        return {"dialogue": value}
+    return {}
+
+
+def extract_json_list(text: str, allow_partial: bool = True) -> List[Any]:
+    """Seed Creator용: 첫 번째 '['부터 완결되는 JSON List (잘렸으면 마지막 완결 항목까지)"""
+    value, _ = scan_json(text, "[", allow_partial)
+    return value if isinstance(value, list) else []
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import pyarrow as pa  # 선택 의존성 (export 전용)
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from Medical_Common import OUTPUT_FILE, estimate_tokens
+from Medical_Dataset_IO import fingerprint, iter_records_since, list_shards, new_cursor
+
+# ==========================================
+# [설정]
+# ==========================================
+INPUT_FILE = OUTPUT_FILE
+EXPORT_DIR = os.path.join(os.path.dirname(OUTPUT_FILE), "sft_export")
+STATE_FILE = os.path.join(EXPORT_DIR, "export_state.json")
+
+# 샘플 렌더링
+EXPORT_MODE = "cot"            # "chat": content만 / "cot": assistant 턴에 thought(+intent)를 <think> 블록으로 포함
+SYSTEM_PROMPT = "당신은 환자를 문진하는 의사입니다. 한 번에 질문 하나만 하고, 충분히 확인한 뒤 요약과 권고로 마무리하십시오."
+
+# 샤드
+SHARD_FORMAT = "arrow"         # "arrow": Arrow IPC 파일 (무압축, 그대로 memory-map) / "parquet": zstd 압축
+ROWS_PER_SHARD = 20000
+SHARD_MAX_BYTES = 256 * 1024 * 1024
+ROW_GROUP_SIZE = 1000          # 한 번에 쓰는 RecordBatch / Parquet row group 크기
+
+# 토큰 길이: 학습에 쓸 토크나이저 (HF 이름 또는 로컬 경로, transformers 필요)
+# None이면 n_tokens / seq_lens는 null, packing은 보수적인 추정치(estimate_tokens) 기준 -> 실제 길이보다 덜 채워짐
+TOKENIZER = None
+
+# Sequence packing (길이 버킷 기반 first-fit-decreasing, 버퍼 크기만큼만 메모리 사용)
+# 샘플 경계는 항상 char_offsets(text 안 각 샘플 시작 문자 위치)로 기록 -> 토크나이저와 무관하게 정확
+PACK_SEQUENCES = False
+PACK_MAX_TOKENS = 4096
+PACK_BUFFER = 2000
+
+# 병렬 렌더링
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+CHUNK_SIZE = 256               # 워커 한 번에 넘기는 레코드 수
+MAX_INFLIGHT = WORKERS * 2     # 동시에 떠 있는 청크 수 상한 (메모리 상한)
+
+
+# ==========================================
+# [렌더링 (워커 프로세스)]
+# ==========================================
+_tokenizer = None
+
+
+def get_tokenizer():
+    """워커 프로세스마다 한 번만 로드"""
+    global _tokenizer
+    if _tokenizer is None:
+        from transformers import AutoTokenizer  # 선택 의존성 (TOKENIZER 설정 시에만)
+        _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER)
+    return _tokenizer
+
+
+def render_messages(record: Dict[str, Any], mode: str) -> List[Dict[str, str]]:
+    dlg = (record.get("conversation") or {}).get("dialogue") or []
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for turn in dlg:
+        role = turn.get("role")
+        content = turn.get("content", "")
+        if role not in ("assistant", "user") or not isinstance(content, str):
+            return []
+        if role == "assistant" and mode == "cot":
+            thought = turn.get("thought", "")
+            intent = turn.get("intent", "")
+            content = f"<think>\n[{intent}] {thought}\n</think>\n{content}"
+        messages.append({"role": role, "content": content})
+    return messages if len(messages) > 2 else []
+
+
+def render_text(messages: List[Dict[str, str]]) -> str:
+    """ChatML 형식 평문 (토크나이저 chat template이 없는 트레이너용)"""
+    return "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+
+
+def render_chunk(records: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
+    """
+    레코드 -> 샘플
+    - n_tokens: TOKENIZER로 센 실제 토큰 수 (없으면 None)
+    - pack_len: packing 기준 길이 (n_tokens, 없으면 estimate_tokens) / 샤드에는 쓰지 않음
+    """
+    samples = []
+    for rec in records:
+        messages = render_messages(rec, mode)
+        if not messages:
+            continue
+        seed = rec.get("seed_info") or {}
+        samples.append({
+            "case_id": rec.get("case_id") if isinstance(rec.get("case_id"), int) else -1,
+            "category": str(seed.get("category", "")),
+            "risk": str(seed.get("risk", "")),
+            "messages": messages,
+            "text": render_text(messages),
+            "n_tokens": None,
+        })
+    if TOKENIZER:
+        ids = get_tokenizer()([s["text"] for s in samples], add_special_tokens=False)["input_ids"] if samples else []
+        for s, seq in zip(samples, ids):
+            s["n_tokens"] = len(seq)
+    for s in samples:
+        s["pack_len"] = s["n_tokens"] if s["n_tokens"] is not None else estimate_tokens(s["text"])
+    return samples
+
+
+# ==========================================
+# [Sequence packing]
+# ==========================================
+class Packer:
+    """
+    버퍼(PACK_BUFFER개)가 찰 때마다 길이(pack_len) 내림차순 first-fit-decreasing으로 max_tokens 빈에 채워 넣음
+    - 길이가 비슷한 샘플끼리 묶이므로 빈 채움률이 높고, 메모리는 버퍼 크기로 고정
+    - max_tokens보다 긴 샘플은 단독 row로 내보냄 (자르기는 트레이너 몫)
+    - row마다 char_offsets(샘플 시작 문자 위치)를 기록 -> 트레이너가 경계 / attention mask를 그대로 복원
+    - seq_lens / n_tokens는 TOKENIZER로 센 실제 토큰 수일 때만 채움 (없으면 null)
+    """
+
+    def __init__(self, max_tokens: int, buffer_size: int) -> None:
+        self.max_tokens = max_tokens
+        self.buffer_size = buffer_size
+        self.buf: List[Dict[str, Any]] = []
+        self.stats: Counter = Counter()
+
+    def add(self, sample: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.buf.append(sample)
+        return self.flush() if len(self.buf) >= self.buffer_size else []
+
+    def flush(self) -> List[Dict[str, Any]]:
+        bins: List[Tuple[int, List[Dict[str, Any]]]] = []
+        for s in sorted(self.buf, key=lambda x: x["pack_len"], reverse=True):
+            n = s["pack_len"]
+            if n > self.max_tokens:
+                self.stats["overlong"] += 1
+                bins.append((n, [s]))
+                continue
+            for i, (used, items) in enumerate(bins):
+                if used + n <= self.max_tokens:
+                    items.append(s)
+                    bins[i] = (used + n, items)
+                    break
+            else:
+                bins.append((n, [s]))
+        self.buf = []
+
+        rows = []
+        for used, items in bins:
+            self.stats["packed_rows"] += 1
+            self.stats["packed_len"] += used
+            offsets, pos = [], 0
+            for s in items:
+                offsets.append(pos)
+                pos += len(s["text"])
+            exact = all(s["n_tokens"] is not None for s in items)
+            rows.append({
+                "case_ids": [s["case_id"] for s in items],
+                "text": "".join(s["text"] for s in items),
+                "char_offsets": offsets,
+                "seq_lens": [s["n_tokens"] for s in items] if exact else None,
+                "n_tokens": used if exact else None,
+            })
+        return rows
+
+
+# ==========================================
+# [샤드 writer]
+# ==========================================
+def make_schema(packed: bool):
+    if packed:
+        return pa.schema([
+            ("case_ids", pa.list_(pa.int64())),
+            ("text", pa.string()),
+            ("char_offsets", pa.list_(pa.int64())),
+            ("seq_lens", pa.list_(pa.int32())),
+            ("n_tokens", pa.int32()),
+        ])
+    return pa.schema([
+        ("case_id", pa.int64()),
+        ("category", pa.string()),
+        ("risk", pa.string()),
+        ("messages", pa.list_(pa.struct([("role", pa.string()), ("content", pa.string())]))),
+        ("text", pa.string()),
+        ("n_tokens", pa.int32()),
+    ])
+
+
+class ShardWriter:
+    """
+    ROWS_PER_SHARD / SHARD_MAX_BYTES 기준으로 회전하는 Arrow IPC / Parquet 샤드 writer
+    - 실행 중에는 *.tmp 이름으로 쓰고, commit()에서 한꺼번에 rename (중간에 죽으면 다음 실행이 tmp를 버리고 다시 함)
+    """
+
+    def __init__(self, out_dir: str, schema, fmt: str, first_shard: int) -> None:
+        self.out_dir = out_dir
+        self.schema = schema
+        self.fmt = fmt
+        self.next_shard = first_shard
+        self.rows_total = 0
+        self.done: List[str] = []
+        self._rows: List[Dict[str, Any]] = []
+        self._writer = None
+        self._sink = None
+        self._path = ""
+        self._shard_rows = 0
+        self._shard_bytes = 0
+
+    def _open(self) -> None:
+        ext = "parquet" if self.fmt == "parquet" else "arrow"
+        self._path = os.path.join(self.out_dir, f"part-{self.next_shard:05d}.{ext}")
+        self.next_shard += 1
+        tmp = self._path + ".tmp"
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(tmp, self.schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(tmp, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        self._shard_rows = 0
+        self._shard_bytes = 0
+
+    def _close(self) -> None:
+        if self._writer is None:
+            return
+        self._write_batch()
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        self._writer = None
+        self.done.append(self._path)
+
+    def _write_batch(self) -> None:
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_table(table)
+        self._shard_bytes += table.nbytes
+        self._rows = []
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self._writer is None:
+            self._open()
+        self._rows.append(row)
+        self._shard_rows += 1
+        self.rows_total += 1
+        if len(self._rows) >= ROW_GROUP_SIZE:
+            self._write_batch()
+        if self._shard_rows >= ROWS_PER_SHARD or self._shard_bytes >= SHARD_MAX_BYTES:
+            self._close()
+
+    def commit(self) -> List[str]:
+        self._close()
+        for p in self.done:
+            os.replace(p + ".tmp", p)
+        return self.done
+
+
+# ==========================================
+# [상태 / 입력]
+# ==========================================
+def empty_state() -> Dict[str, Any]:
+    return {"cursor": new_cursor(), "fingerprint": fingerprint(INPUT_FILE, new_cursor()), "next_shard": 0, "records": 0, "rows": 0, "settings": None}
+
+
+def load_state() -> Dict[str, Any]:
+    """
+    export_state.json 로드
+    - cursor 직전 내용의 fingerprint가 달라졌으면(OVERWRITE_OUTPUT / 파일이 줄어들거나 새로 쓰임) 옛 cursor로 seek하면
+      그 앞의 새 레코드를 놓치고 첫 레코드를 줄 중간부터 읽게 됨 -> 기존 샤드를 버리고 처음부터 다시 export
+    """
+    if not os.path.exists(STATE_FILE):
+        return empty_state()
+    with open(STATE_FILE, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    # fingerprint 없는 옛 상태 파일은 그대로 신뢰 (다음 save_state부터 기록)
+    if "fingerprint" in state and fingerprint(INPUT_FILE, state["cursor"]) != state["fingerprint"]:
+        print(f"Dataset changed since last export (cursor={state['cursor']}). Discarding {state['next_shard']} shard(s) and exporting from scratch.")
+        fresh = empty_state()
+        fresh["settings"] = state["settings"]
+        return fresh
+    return state
+
+
+def save_state(state: Dict[str, Any]) -> None:
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+def cleanup_orphans(next_shard: int) -> None:
+    """이전 실행이 commit 전에 죽으면서 남긴 tmp / 상태에 반영 안 된 샤드 제거"""
+    for name in os.listdir(EXPORT_DIR):
+        if not name.startswith("part-"):
+            continue
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(EXPORT_DIR, name))
+            continue
+        try:
+            no = int(name[5:10])
+        except ValueError:
+            continue
+        if no >= next_shard:
+            os.remove(os.path.join(EXPORT_DIR, name))
+
+
+def iter_chunks(cursor: Dict[str, int], stats: Counter) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, int]]]:
+    chunk: List[Dict[str, Any]] = []
+    last = cursor
+    for rec, cur in iter_records_since(INPUT_FILE, cursor):
+        chunk.append(rec)
+        last = cur
+        stats["records"] += 1
+        if len(chunk) >= CHUNK_SIZE:
+            yield chunk, last
+            chunk = []
+    if chunk:
+        yield chunk, last
+
+
+# ==========================================
+# [메인 로직]
+# ==========================================
+def main(mode: str = EXPORT_MODE, pack: bool = PACK_SEQUENCES, fmt: str = SHARD_FORMAT) -> None:
+    if pa is None:
+        print("pyarrow is required for export (pip install pyarrow).")
+        return
+    if not os.path.exists(INPUT_FILE) and not list_shards(INPUT_FILE):
+        print(f"Input not found: {INPUT_FILE}")
+        return
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    state = load_state()
+    if TOKENIZER:
+        try:
+            import transformers  # noqa: F401
+        except ImportError:
+            print("transformers is required when TOKENIZER is set (pip install transformers).")
+            return
+    elif pack:
+        print("TOKENIZER is not set: packing by estimated token counts (rows stay under PACK_MAX_TOKENS but are under-filled).")
+
+    settings = {"mode": mode, "pack": pack, "pack_max_tokens": PACK_MAX_TOKENS if pack else None, "format": fmt, "tokenizer": TOKENIZER}
+    if state["settings"] is not None and state["settings"] != settings:
+        print(f"Export settings changed ({state['settings']} -> {settings}). Use a new EXPORT_DIR for a different layout.")
+        return
+    cleanup_orphans(state["next_shard"])
+
+    print(f"Exporting {INPUT_FILE} -> {EXPORT_DIR} (mode={mode}, pack={pack}, format={fmt}, workers={WORKERS})")
+    print(f"Resuming after {state['records']} records (cursor={state['cursor']})")
+
+    stats: Counter = Counter()
+    writer = ShardWriter(EXPORT_DIR, make_schema(pack), fmt, state["next_shard"])
+    packer = Packer(PACK_MAX_TOKENS, PACK_BUFFER) if pack else None
+    cursor = state["cursor"]
+
+    def emit(samples: List[Dict[str, Any]]) -> None:
+        for s in samples:
+            stats["samples"] += 1
+            if packer is None:
+                s.pop("pack_len")
+                writer.write(s)
+            else:
+                for row in packer.add(s):
+                    writer.write(row)
+
+    # 순서 보존 + 동시 청크 수 상한 (입력 전체를 큐에 올리지 않음)
+    with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+        inflight: deque = deque()
+        for chunk, cur in iter_chunks(cursor, stats):
+            inflight.append((ex.submit(render_chunk, chunk, mode), cur))
+            if len(inflight) >= MAX_INFLIGHT:
+                fut, cursor = inflight.popleft()
+                emit(fut.result())
+        while inflight:
+            fut, cursor = inflight.popleft()
+            emit(fut.result())
+
+    if packer is not None:
+        for row in packer.flush():
+            writer.write(row)
+    shards = writer.commit()
+
+    state.update(
+        cursor=cursor,
+        fingerprint=fingerprint(INPUT_FILE, cursor),
+        next_shard=writer.next_shard,
+        records=state["records"] + stats["records"],
+        rows=state["rows"] + writer.rows_total,
+        settings=settings,
+    )
+    save_state(state)
+
+    stats["skipped"] = stats["records"] - stats["samples"]
+    if packer is not None:
+        stats.update(packer.stats)
+    print(f"Done. new_records={stats['records']}, rows={writer.rows_total}, shards={[os.path.basename(p) for p in shards]}")
+    print(f"Stats: {dict(stats)}")
+
+
+if __name__ == "__main__":
+    # mode: "chat" | "cot" / pack: 길이 버킷 sequence packing / fmt: "arrow" | "parquet"
+    main(mode=EXPORT_MODE, pack=PACK_SEQUENCES, fmt=SHARD_FORMAT)
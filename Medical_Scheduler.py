@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import random
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# ==========================================
+# [설정]
+# ==========================================
+PRIOR_STRENGTH = 4.0      # arm 데이터가 적을 때 (doctor, user) 쌍 전체 통계를 몇 건 분량의 prior로 쓸지
+DEFAULT_TOKENS = 6000.0   # 관측이 전혀 없을 때 케이스당 토큰 비용 가정치
+
+
+def style_label(style: str) -> str:
+    """'Passive: 단답형으로 ...' -> 'Passive' (프롬프트 문구가 바뀌어도 통계가 유지되도록 라벨만 키로 사용)"""
+    return style.split(":", 1)[0].strip()
+
+
+class StyleScheduler:
+    """
+    (category, risk, doctor_style, user_style) 별 수락률 / 토큰 비용을 온라인으로 추정하고
+    Thompson sampling으로 '토큰당 수락 레코드 수'가 높은 스타일 쌍과 시드를 먼저 고름
+
+    - 수락률: Beta 사후분포 (arm 관측 + 같은 스타일 쌍의 전체 평균을 PRIOR_STRENGTH 건 분량 prior로)
+    - 비용: arm 평균 토큰 (관측이 적으면 스타일 쌍 평균 -> 전체 평균으로 back-off)
+    - 다양성 하한: 각 스타일 쌍이 현재 데이터셋 수락 레코드의 min_share / (쌍 개수) 비율 아래로 떨어지면 그 쌍을 우선 배정
+    - 통계는 JSON으로 저장 / 로드 (실행 간 유지)
+      수락률 / 비용 추정치는 teacher와 프롬프트에 대한 것이라 데이터셋을 새로 써도 유지하고,
+      다양성 하한용 수락 레코드 수(records)만 reset_records()로 비움
+    """
+
+    def __init__(
+        self,
+        doctor_styles: List[str],
+        user_styles: List[str],
+        min_share: float = 0.5,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.doctor_styles = doctor_styles
+        self.user_styles = user_styles
+        self.pairs: List[Tuple[str, str]] = [(d, u) for d in doctor_styles for u in user_styles]
+        self.min_share = min_share
+        self.rng = rng or random.Random()
+        # key -> [tries, accepted, tokens]
+        self.arms: Dict[str, List[float]] = {}
+        self.pair_stats: Dict[str, List[float]] = {}
+        self.total = [0.0, 0.0, 0.0]
+        # 스타일 쌍 key -> 현재 데이터셋에 들어간 수락 레코드 수 (다양성 하한 전용)
+        self.records: Dict[str, float] = {}
+
+    # ---------- 키 ----------
+    @staticmethod
+    def _pair_key(doctor_style: str, user_style: str) -> str:
+        return f"{style_label(doctor_style)}|{style_label(user_style)}"
+
+    @staticmethod
+    def _cell(seed: Dict[str, Any]) -> str:
+        return f"{seed.get('category', '')}|{seed.get('risk', '')}"
+
+    def _arm_key(self, seed: Dict[str, Any], doctor_style: str, user_style: str) -> str:
+        return f"{self._cell(seed)}|{self._pair_key(doctor_style, user_style)}"
+
+    # ---------- 추정 ----------
+    def _mean_tokens(self, arm: List[float], pair: List[float]) -> float:
+        for st in (arm, pair, self.total):
+            if st[0] >= 3:
+                return st[2] / st[0]
+        return DEFAULT_TOKENS
+
+    def _sample_value(self, seed: Dict[str, Any], doctor_style: str, user_style: str) -> float:
+        """수락 확률 샘플 / 예상 토큰 -> 토큰당 수락 레코드 수 샘플"""
+        pair = self.pair_stats.get(self._pair_key(doctor_style, user_style), [0.0, 0.0, 0.0])
+        arm = self.arms.get(self._arm_key(seed, doctor_style, user_style), [0.0, 0.0, 0.0])
+        p_pair = (pair[1] + 1.0) / (pair[0] + 2.0)
+        alpha = 1.0 + arm[1] + PRIOR_STRENGTH * p_pair
+        beta = 1.0 + (arm[0] - arm[1]) + PRIOR_STRENGTH * (1.0 - p_pair)
+        return self.rng.betavariate(alpha, beta) / self._mean_tokens(arm, pair)
+
+    def _starved_pairs(self) -> List[Tuple[str, str]]:
+        """현재 데이터셋의 수락 레코드 비율이 다양성 하한 아래인 스타일 쌍"""
+        accepted = sum(self.records.values())
+        if accepted <= 0 or self.min_share <= 0:
+            return []
+        floor = self.min_share * accepted / len(self.pairs)
+        return [p for p in self.pairs if self.records.get(self._pair_key(*p), 0.0) < floor]
+
+    # ---------- public ----------
+    def choose(self, seed: Dict[str, Any]) -> Tuple[str, str, float]:
+        """seed에 쓸 (doctor_style, user_style, 샘플된 value)"""
+        candidates = self._starved_pairs() or self.pairs
+        value, d, u = max((self._sample_value(seed, d, u), d, u) for d, u in candidates)
+        return d, u, value
+
+    def order(self, seeds: Iterable[Dict[str, Any]], window: int = 64) -> Iterator[Tuple[Dict[str, Any], str, str]]:
+        """
+        작업 큐 정렬: window개의 시드 중 샘플된 value가 가장 높은 시드를 먼저 내보냄
+        - 메모리는 window 크기로 고정 (스트리밍 시드 로더와 그대로 연결)
+        - window * 4번 넘게 밀린 시드는 value와 무관하게 내보냄 (기아 방지)
+        """
+        it = iter(seeds)
+        buf: deque = deque()
+        tick = 0
+        for s in it:
+            buf.append((tick, s))
+            if len(buf) >= window:
+                break
+        while buf:
+            tick += 1
+            oldest_tick, oldest = buf[0]
+            if tick - oldest_tick > window * 4:
+                buf.popleft()
+                seed = oldest
+                d, u, _ = self.choose(seed)
+            else:
+                best_i, best = 0, None
+                for i, (_, s) in enumerate(buf):
+                    d_s, u_s, v = self.choose(s)
+                    if best is None or v > best[2]:
+                        best_i, best = i, (d_s, u_s, v)
+                seed = buf[best_i][1]
+                del buf[best_i]
+                d, u = best[0], best[1]
+            yield seed, d, u
+            nxt = next(it, None)
+            if nxt is not None:
+                buf.append((tick, nxt))
+
+    def update(self, seed: Dict[str, Any], doctor_style: str, user_style: str, accepted: bool, tokens: int) -> None:
+        for stats, key in (
+            (self.arms, self._arm_key(seed, doctor_style, user_style)),
+            (self.pair_stats, self._pair_key(doctor_style, user_style)),
+        ):
+            st = stats.setdefault(key, [0.0, 0.0, 0.0])
+            st[0] += 1
+            st[1] += 1 if accepted else 0
+            st[2] += tokens
+        self.total[0] += 1
+        self.total[1] += 1 if accepted else 0
+        self.total[2] += tokens
+        if accepted:
+            pair_key = self._pair_key(doctor_style, user_style)
+            self.records[pair_key] = self.records.get(pair_key, 0.0) + 1
+
+    def reset_records(self) -> None:
+        """데이터셋을 새로 쓸 때 (OVERWRITE_OUTPUT): 다양성 하한용 레코드 수만 비우고 수락률 / 비용 추정치는 유지"""
+        self.records = {}
+
+    def summary(self) -> List[Tuple[str, int, float, float]]:
+        """스타일 쌍별 (key, tries, 수락률, 평균 토큰) - 수락률 높은 순"""
+        rows = []
+        for key, (n, acc, tok) in self.pair_stats.items():
+            if n:
+                rows.append((key, int(n), acc / n, tok / n))
+        return sorted(rows, key=lambda r: -r[2])
+
+    # ---------- 저장 ----------
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"arms": self.arms, "records": self.records}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        """
+        저장된 arm 통계 로드 (스타일 쌍 / 전체 통계는 arm에서 다시 계산), 로드한 arm 수 반환
+        - records가 없는 옛 상태 파일은 스타일 쌍의 수락 수를 그대로 레코드 수로 씀
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            arms = state.get("arms", {})
+            records = state.get("records")
+        except Exception as e:
+            print(f"[Scheduler] state load failed: {e}. Starting fresh.")
+            return 0
+        self.arms, self.pair_stats, self.total = {}, {}, [0.0, 0.0, 0.0]
+        for key, st in arms.items():
+            self.arms[key] = [float(x) for x in st]
+            pair_key = "|".join(key.split("|")[-2:])
+            ps = self.pair_stats.setdefault(pair_key, [0.0, 0.0, 0.0])
+            for i in range(3):
+                ps[i] += self.arms[key][i]
+                self.total[i] += self.arms[key][i]
+        if records is None:
+            records = {k: st[1] for k, st in self.pair_stats.items()}
+        self.records = {k: float(v) for k, v in records.items()}
+        return len(self.arms)
@@ -11,16 +11,21 @@ import requests
 from collections import Counter
 from typing import Any, Dict, List, Optional, Tuple
 
+from Medical_Common import (
+    BASE_DIR, INPUT_FILE, KEEP_ALIVE, MODEL, NUM_CTX_BUCKETS, PORTS,
+    base_num_ctx, estimate_tokens, is_truncated, pick_ctx_bucket,
+)
+from Medical_JSON_Extractor import extract_json_list
+
 # ==========================================
 # [설정]
 # ==========================================
-PORTS = [22134]  # SSH 터널링 포트들 (여러 개면 로드밸런싱)
-MODEL = "gpt-oss:120b"
-
-BASE_DIR = "/home/HongKi-Arch/Desktop/LLM_DATASET_Project/Data"
-OUTPUT_FILE = os.path.join(BASE_DIR, "scenarios.json")
+# 엔드포인트(PORTS / MODEL / KEEP_ALIVE)와 num_ctx 정책은 Medical_Common.py에서 설정 (Data Creator와 공용)
+OUTPUT_FILE = INPUT_FILE   # Data Creator의 시드 입력
+SEED_OUT_TOKENS = 1536        # gpt-oss reasoning 토큰 포함
 
 cycle = itertools.cycle(PORTS)
+port_ctx: Dict[int, int] = {}
 
 # ==========================================
 # [타겟 카테고리]
@@ -67,25 +72,39 @@ def call_llm(
 ) -> str:
     """
     Ollama /api/generate 호출 (재시도 + 간단 백오프 포함)
+    - num_ctx는 Data Creator와 같은 포트별 시작값(base_num_ctx) -> 두 스크립트가 같은 포트를 써도 reload 없음
+      (프롬프트가 안 들어가면 그 버킷으로, 출력이 잘리면 다음 버킷으로 올려 재요청 / 재시도 횟수 소모 없음)
     """
     last_err: Optional[Exception] = None
-    for attempt in range(1, retries + 1):
+    need = estimate_tokens(prompt) + SEED_OUT_TOKENS
+    attempt = 0
+    while attempt < retries:
+        attempt += 1
         port = next(cycle)
+        num_ctx = port_ctx.setdefault(port, max(base_num_ctx(port), pick_ctx_bucket(need)))
         url = f"http://127.0.0.1:{port}/api/generate"
         payload = {
             "model": MODEL,
             "prompt": prompt,
             "stream": False,
+            "keep_alive": KEEP_ALIVE,
             "options": {
                 "temperature": temperature,
                 "top_p": 0.9,
-                "num_ctx": 4096
+                "num_ctx": num_ctx
             },
         }
         try:
             r = requests.post(url, json=payload, timeout=timeout)
             r.raise_for_status()
-            return r.json().get("response", "")
+            body = r.json()
+            if is_truncated(body, num_ctx) and num_ctx < NUM_CTX_BUCKETS[-1]:
+                need = max(need, num_ctx + 1)
+                port_ctx[port] = pick_ctx_bucket(need)
+                print(f"[call_llm] output truncated at num_ctx={num_ctx} on port {port}, retry with num_ctx={port_ctx[port]}")
+                attempt -= 1
+                continue
+            return body.get("response", "")
         except Exception as e:
             last_err = e
             sleep_s = backoff_base * attempt
@@ -96,45 +115,6 @@ def call_llm(
     return ""
 
 
-def robust_json_parse(text: str) -> List[Dict[str, Any]]:
-    """
-    스택 기반 견고한 JSON List 파싱
-    - 가장 앞 '['부터 balanced bracket로 닫히는 ']'까지를 잘라 json.loads
-    """
-    if not text:
-        return []
-    try:
-        start = text.find("[")
-        if start == -1:
-            return []
-
-        s = text[start:]
-        depth = 0
-        in_string = False
-        escape = False
-
-        for i, ch in enumerate(s):
-            if in_string:
-                if escape:
-                    escape = False
-                elif ch == "\\":
-                    escape = True
-                elif ch == '"':
-                    in_string = False
-            else:
-                if ch == '"':
-                    in_string = True
-                elif ch == "[":
-                    depth += 1
-                elif ch == "]":
-                    depth -= 1
-                    if depth == 0:
-                        return json.loads(s[: i + 1])
-    except Exception:
-        return []
-    return []
-
-
 def normalize_text(text: str) -> str:
     """
     중복 제거를 위한 텍스트 정규화
@@ -328,7 +308,7 @@ def main(
             fail_stats["empty_response"] += 1
             consecutive_failures += 1
         else:
-            batch = robust_json_parse(raw)
+            batch = extract_json_list(raw)
             if not batch:
                 fail_stats["parse_error"] += 1
                 consecutive_failures += 1
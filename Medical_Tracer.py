@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import atexit
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# ==========================================
+# [Chrome / Perfetto trace-event 기록기]
+# ==========================================
+# 비활성 상태에서 span()이 돌려주는 공용 args (기록되지 않으므로 덮어써도 무방)
+_NULL_ARGS: Dict[str, Any] = {}
+
+
+class Tracer:
+    """
+    케이스 단계 / HTTP 시도별 span을 Chrome trace-event(JSON Array) 포맷으로 기록
+    - start(path)를 호출하기 전에는 span()이 아무것도 하지 않음 (오버헤드 ~ 함수 호출 1번)
+    - 이벤트는 메모리 버퍼에 모았다가 flush_every개마다 파일에 append
+    - 파일은 '[' 로 시작하는 JSON 배열이고 close() 시 ']'로 닫힘
+      (닫히지 않은 파일도 chrome://tracing / ui.perfetto.dev 에서 그대로 열림)
+    - track=None 이면 현재 스레드 트랙, track=포트번호 처럼 주면 그 이름의 별도 트랙 (엔드포인트 점유 확인용)
+    """
+
+    def __init__(self, flush_every: int = 1000) -> None:
+        self.enabled = False
+        self.flush_every = flush_every
+        self._f = None
+        self._first = True
+        self._buf: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._tracks: Dict[Any, int] = {}
+        self._pid = os.getpid()
+        self._t0 = time.perf_counter_ns()
+
+    # ---------- lifecycle ----------
+    def start(self, path: str) -> None:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._f = open(path, "w", encoding="utf-8")
+        self._f.write("[\n")
+        self._first = True
+        self._t0 = time.perf_counter_ns()
+        self.enabled = True
+        self._meta("process_name", 0, {"name": "Medical_Data_Creator"})
+        # Ctrl-C 등으로 중단돼도 버퍼에 남은 이벤트까지 기록
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._flush()
+            self._f.write("\n]\n")
+            self._f.close()
+            self.enabled = False
+
+    # ---------- context ----------
+    def set_case(self, case_id: Optional[int]) -> None:
+        """이후 이 스레드에서 기록되는 span에 case_id 태그"""
+        self._local.case_id = case_id
+
+    # ---------- events ----------
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", track: Any = None, **args: Any) -> Iterator[Dict[str, Any]]:
+        """with tracer.span("http", cat="llm", track=port, port=port) as a: a["status"] = 200"""
+        if not self.enabled:
+            yield _NULL_ARGS
+            return
+        case_id = getattr(self._local, "case_id", None)
+        if case_id is not None:
+            args["case_id"] = case_id
+        t_start = time.perf_counter_ns()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            t_end = time.perf_counter_ns()
+            self._emit({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": (t_start - self._t0) / 1000.0,
+                "dur": (t_end - t_start) / 1000.0,
+                "pid": self._pid,
+                "tid": self._tid(track),
+                "args": args,
+            })
+
+    # ---------- 내부 ----------
+    def _tid(self, track: Any) -> int:
+        key = ("thread", threading.get_ident()) if track is None else ("track", track)
+        tid = self._tracks.get(key)
+        if tid is None:
+            with self._lock:
+                tid = self._tracks.get(key)
+                if tid is None:
+                    tid = len(self._tracks) + 1
+                    self._tracks[key] = tid
+                    label = threading.current_thread().name if track is None else f"port {track}" if isinstance(track, int) else str(track)
+                    self._buf.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": label}})
+        return tid
+
+    def _meta(self, name: str, tid: int, args: Dict[str, Any]) -> None:
+        self._emit({"name": name, "ph": "M", "pid": self._pid, "tid": tid, "args": args})
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buf.append(event)
+            if len(self._buf) >= self.flush_every:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._buf or self._f is None:
+            return
+        parts = []
+        for ev in self._buf:
+            parts.append(("" if self._first else ",\n") + json.dumps(ev, ensure_ascii=False, default=str))
+            self._first = False
+        self._f.write("".join(parts))
+        self._f.flush()
+        self._buf = []
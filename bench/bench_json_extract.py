@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON 추출기 마이크로 벤치마크 + 회귀 코퍼스 검증
+- bench/teacher_outputs.jsonl 의 각 응답에 대해 legacy(regex + 단순 괄호 스캔) vs 현재 추출기 비교
+- 파싱 시간(케이스당 µs)과 salvage rate(쓸 수 있는 구조를 건졌는지)를 출력
+- 코퍼스의 expect("full" | "partial" | "none")와 현재 추출기 결과가 다르면 exit code 1
+  (expect_items가 있으면 건진 턴/항목 수도 비교 -> 잘린 턴이 반쪽으로 섞여 들어오면 회귀)
+
+사용: python bench/bench_json_extract.py
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Medical_JSON_Extractor import extract_json, extract_json_list, scan_json  # noqa: E402
+
+# ==========================================
+# [설정]
+# ==========================================
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teacher_outputs.jsonl")
+REPEAT = 200
+
+
+# ==========================================
+# [Legacy 구현 (비교용, 기존 Medical_Data_Creator.extract_json)]
+# ==========================================
+def legacy_extract_json(text: str) -> Dict[str, Any]:
+    if not text: return {}
+    m = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, flags=re.DOTALL)
+    if m:
+        try: return json.loads(m.group(1))
+        except: pass
+    m_list = re.search(r"```(?:json)?\s*(\[.*?\])\s*```", text, flags=re.DOTALL)
+    if m_list:
+        try: return {"dialogue": json.loads(m_list.group(1))}
+        except: pass
+    start = text.find("{")
+    if start != -1:
+        count = 0
+        for i, char in enumerate(text[start:], start):
+            if char == '{': count += 1
+            elif char == '}': count -= 1
+            if count == 0:
+                try: return json.loads(text[start:i+1])
+                except: break
+    start = text.find("[")
+    if start != -1:
+        count = 0
+        for i, char in enumerate(text[start:], start):
+            if char == '[': count += 1
+            elif char == ']': count -= 1
+            if count == 0:
+                try: return {"dialogue": json.loads(text[start:i+1])}
+                except: break
+    return {}
+
+
+# ==========================================
+# [평가]
+# ==========================================
+def salvaged(stage: str, value: Any) -> bool:
+    """파이프라인 다음 단계로 넘길 수 있는 구조인지"""
+    if stage == "profile":
+        return isinstance(value, dict) and "profile" in value and "symptoms" in value
+    if stage == "dialogue":
+        return isinstance(value, dict) and isinstance(value.get("dialogue"), list) and len(value["dialogue"]) >= 2
+    return isinstance(value, list) and len(value) > 0
+
+
+def n_items(stage: str, value: Any) -> int:
+    if stage == "dialogue":
+        return len(value.get("dialogue", [])) if isinstance(value, dict) else 0
+    return len(value) if isinstance(value, list) else 0
+
+
+def run_current(stage: str, text: str) -> Any:
+    return extract_json_list(text) if stage == "seed" else extract_json(text)
+
+
+def run_legacy(stage: str, text: str) -> Any:
+    if stage == "seed":
+        v = legacy_extract_json(text).get("dialogue")
+        return v if isinstance(v, list) else []
+    return legacy_extract_json(text)
+
+
+def bench(fn, cases: List[Dict[str, Any]]) -> float:
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        for c in cases:
+            fn(c["stage"], c["text"])
+    return (time.perf_counter() - t0) / (REPEAT * len(cases)) * 1e6
+
+
+def main() -> int:
+    with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    regressions = 0
+    print(f"{'id':<36} {'expect':<8} {'status':<8} legacy  current")
+    for c in cases:
+        _, status = scan_json(c["text"], "[" if c["stage"] == "seed" else "{[", allow_partial=True)
+        status = {"ok": "full", "fail": "none"}.get(status, status)
+        old_ok = salvaged(c["stage"], run_legacy(c["stage"], c["text"]))
+        new_value = run_current(c["stage"], c["text"])
+        new_ok = salvaged(c["stage"], new_value)
+        mark = "" if status == c["expect"] else "  <-- REGRESSION"
+        if not mark and "expect_items" in c and n_items(c["stage"], new_value) != c["expect_items"]:
+            mark = f"  <-- REGRESSION (items={n_items(c['stage'], new_value)}, expected {c['expect_items']})"
+        regressions += bool(mark)
+        print(f"{c['id']:<36} {c['expect']:<8} {status:<8} {'Y' if old_ok else '-':<7} {'Y' if new_ok else '-'}{mark}")
+
+    n = len(cases)
+    old_rate = sum(salvaged(c["stage"], run_legacy(c["stage"], c["text"])) for c in cases) / n
+    new_rate = sum(salvaged(c["stage"], run_current(c["stage"], c["text"])) for c in cases) / n
+    old_us = bench(run_legacy, cases)
+    new_us = bench(run_current, cases)
+
+    print()
+    print(f"cases={n} repeat={REPEAT}")
+    print(f"legacy : {old_us:8.1f} us/case  salvage={old_rate:.0%}")
+    print(f"current: {new_us:8.1f} us/case  salvage={new_rate:.0%}")
+    print(f"regressions={regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
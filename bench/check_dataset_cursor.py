@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+증분 cursor(SFT export 상태 / Analyzer 캐시) 회귀 검증
+- 레코드 12건 처리 -> remove_dataset (OVERWRITE_OUTPUT 경로) -> 새 레코드 5건 -> 다시 처리
+  새 5건을 모두 읽어야 정상 (옛 cursor를 믿으면 new_records=0 으로 조용히 유실)
+- 같은 데이터셋에 레코드가 추가되기만 했으면 (열린 프레임이 커져도) cursor를 유지해야 정상
+- 처리는 writer가 열려 있는 동안 수행 (Data Creator 실행 중 export / 분석 -> cursor가 아직 열린 프레임 0 안에 있음)
+- 평문 / gzip 샤드 두 가지 모두 확인, 실패가 있으면 exit code 1
+
+사용: python bench/check_dataset_cursor.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Medical_Data_Analyzer as analyzer  # noqa: E402
+import Medical_SFT_Exporter as exporter  # noqa: E402
+from Medical_Dataset_IO import DatasetWriter, fingerprint, iter_records_since, remove_dataset  # noqa: E402
+
+
+def write_records(w: DatasetWriter, ids: List[int]) -> None:
+    for i in ids:
+        w.write({"case_id": i, "seed_info": {"category": "c", "risk": "low"},
+                 "conversation": {"dialogue": [{"role": "assistant", "content": f"질문 {i}?", "intent": "onset"},
+                                               {"role": "user", "content": f"답 {i}"}]}})
+
+
+def export_pass(path: str) -> List[int]:
+    """exporter의 상태 로드 / 저장 경로만 그대로 밟음 (pyarrow 없이)"""
+    state = exporter.load_state()
+    cursor, got = state["cursor"], []
+    for rec, cur in iter_records_since(path, cursor):
+        got.append(rec["case_id"])
+        cursor = cur
+    state.update(cursor=cursor, fingerprint=fingerprint(path, cursor), next_shard=state["next_shard"] + 1)
+    exporter.save_state(state)
+    return got
+
+
+def analyze_pass() -> int:
+    cache = analyzer.load_cache()
+    _, new_records = analyzer.update_dataset(cache)
+    analyzer.save_cache(cache)
+    return new_records
+
+
+def check(compression: Optional[str]) -> int:
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "medical_chat_data.jsonl")
+        exporter.INPUT_FILE = path
+        exporter.EXPORT_DIR = tmp
+        exporter.STATE_FILE = os.path.join(tmp, "export_state.json")
+        analyzer.OUTPUT_FILE = path
+        analyzer.CACHE_FILE = path + ".analytics.json"
+        analyzer.WORKERS = 1
+
+        with DatasetWriter(path, compression=compression, flush_every=1, flush_interval=0) as w:
+            write_records(w, list(range(12)))
+            first = (export_pass(path), analyze_pass())
+            write_records(w, [12, 13])
+            grown = (export_pass(path), analyze_pass())
+        remove_dataset(path)
+        with DatasetWriter(path, compression=compression, flush_every=1, flush_interval=0) as w:
+            write_records(w, list(range(100, 105)))
+            rewritten = (export_pass(path), analyze_pass())
+
+        failures = 0
+        for name, (got, n), expect in (
+            ("initial", first, list(range(12))),
+            ("appended", grown, [12, 13]),
+            ("overwritten", rewritten, list(range(100, 105))),
+        ):
+            ok = got == expect and n == len(expect)
+            failures += not ok
+            print(f"{str(compression):<6} {name:<12} export={got} analyzer_new={n}{'' if ok else '  <-- REGRESSION'}")
+        return failures
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main() -> int:
+    failures = check(None) + check("gzip")
+    print(f"regressions={failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())